@@ -0,0 +1,264 @@
+# benchmark.py
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+
+###############################################################################
+# Retrieval Micro-benchmarks
+###############################################################################
+# Runs offline against synthetic corpora (or a folder from build_index.py)
+# and reports, per corpus size and stage:
+#   p50 / p95 / p99 latency (ms), throughput per core (calls per CPU-second),
+#   peak Python/numpy memory during the stage (tracemalloc) and process RSS.
+#
+#   python benchmark.py --sizes 500,5000,50000 --json bench.json
+#   python benchmark.py --sizes 5000 --compare bench.json     # vs another commit
+#   python benchmark.py --hybrid per-token                    # one query path only
+#
+# Stages: model_load, artifact_load, build_hybrid_vector, get_max_similarity,
+# retrieve_top_n, score_answer, retrieve_top_n_batch (6 answers per call).
+# retrieval.py is imported with DISC_LOCAL_ARTIFACTS_DIR set, so no GCS access
+# is needed; the model must already be in the local Hugging Face cache.
+#
+# --hybrid picks how answer vectors are built: "per-token" (what production
+# uses on the legacy GCS artifacts), "matmul" (vocabulary matrix) or "both"
+# (default). Results are keyed "<corpus>:<path>".
+###############################################################################
+QUESTION_IDS = ["Q1", "Q2", "Q3", "Q4", "Q5", "Q6"]
+# --hybrid value -> DISC_USE_VOCAB_MATRIX
+HYBRID_PATHS = {"per-token": "0", "matmul": "1"}
+DISC_TYPES = ["D", "I", "S", "C"]
+
+# Small per-type word pools plus shared filler give the synthetic corpus a
+# realistic, bounded vocabulary with some signal per DiSC type.
+TYPE_WORDS = {
+    "D": "decide fast results goal win lead direct challenge control push action deadline drive target".split(),
+    "I": "people team fun excite share talk inspire idea energy friend positive story celebrate social".split(),
+    "S": "calm support steady help harmony patient listen trust stable care routine loyal gentle together".split(),
+    "C": "plan detail analyse accurate check data careful quality rule process research review logic precise".split(),
+}
+FILLER_WORDS = (
+    "i we usually when the a to and it my work task change situation time others first then "
+    "before after because so that this with for about on in of prefer like try make sure"
+).split()
+
+def synthetic_answer(rng: random.Random, disc_type: str, words: int = 40) -> str:
+    signal = TYPE_WORDS[disc_type]
+    return " ".join(rng.choice(signal) if rng.random() < 0.35 else rng.choice(FILLER_WORDS) for _ in range(words))
+
+def write_synthetic_corpus(path: str, size: int, seed: int = 0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["question_id", "type", "text"])
+        for i in range(size):
+            disc_type = DISC_TYPES[i % len(DISC_TYPES)]
+            writer.writerow([QUESTION_IDS[(i // len(DISC_TYPES)) % len(QUESTION_IDS)], disc_type,
+                             synthetic_answer(rng, disc_type)])
+
+def synthetic_queries(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [(synthetic_answer(rng, rng.choice(DISC_TYPES), words=rng.randint(15, 80)), QUESTION_IDS[i % 6])
+            for i in range(count)]
+
+###############################################################################
+# Measurement
+###############################################################################
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def measure(fn, args_list: list, memory_sample: int = 20) -> dict:
+    """Time fn(*args) for each args; then re-run a sample under tracemalloc for peak memory."""
+    latencies = []
+    cpu_start = time.process_time()
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    cpu_s = time.process_time() - cpu_start
+
+    tracemalloc.start()
+    for args in args_list[:memory_sample]:
+        fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "throughput_per_core": len(latencies) / cpu_s if cpu_s > 0 else None,
+        "py_peak_mb": peak / (1024 * 1024),
+        "max_rss_mb": _rss_mb(),
+    }
+
+def measure_once(fn) -> tuple:
+    """(result, stats) for a one-off stage such as a cold load."""
+    tracemalloc.start()
+    cpu_start = time.process_time()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    cpu_s = time.process_time() - cpu_start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {
+        "calls": 1, "p50_ms": elapsed_ms, "p95_ms": elapsed_ms, "p99_ms": elapsed_ms, "mean_ms": elapsed_ms,
+        "throughput_per_core": 1 / cpu_s if cpu_s > 0 else None,
+        "py_peak_mb": peak / (1024 * 1024), "max_rss_mb": _rss_mb(),
+    }
+
+###############################################################################
+# Runner
+###############################################################################
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except Exception:
+        return None
+
+def run(sizes: list, queries: int, backend: str, workers: int, vector_dtype: str, work_dir: str,
+        artifacts_dir: str = None, hybrid_paths: list = None) -> dict:
+    from build_index import build_index
+
+    # One artifact folder per corpus size (or the single folder given)
+    artifact_dirs = {}
+    build_s = {}
+    if artifacts_dir:
+        artifact_dirs["bundled"] = artifacts_dir
+    else:
+        for size in sizes:
+            source = os.path.join(work_dir, f"corpus_{size}.csv")
+            write_synthetic_corpus(source, size)
+            t0 = time.perf_counter()
+            manifest = build_index(source, os.path.join(work_dir, f"build_{size}"), backend, workers,
+                                   vector_dtype=vector_dtype)
+            build_s[str(size)] = time.perf_counter() - t0
+            artifact_dirs[str(size)] = os.path.join(work_dir, f"build_{size}", manifest["version"])
+
+    first_dir = next(iter(artifact_dirs.values()))
+    os.environ["DISC_LOCAL_ARTIFACTS_DIR"] = first_dir
+    os.environ["DISC_EMBEDDING_BACKEND"] = backend
+    os.environ["DISC_VECTOR_DTYPE"] = vector_dtype
+    hybrid_paths = hybrid_paths or list(HYBRID_PATHS)
+    os.environ["DISC_USE_VOCAB_MATRIX"] = HYBRID_PATHS[hybrid_paths[0]]
+
+    from embedding_backends import MODEL_NAME, load_embedding_backend
+    _, model_load = measure_once(lambda: load_embedding_backend(backend, MODEL_NAME))
+
+    # Importing retrieval loads the model and the first artifact version
+    retrieval, import_stats = measure_once(lambda: __import__("retrieval"))
+
+    query_list = synthetic_queries(queries)
+    answer_args = [(text,) for text, _ in query_list]
+    scored_args = [(text, qid) for text, qid in query_list]
+    batch_args = [([t for t, _ in query_list[i:i + 6]], [q for _, q in query_list[i:i + 6]], 4)
+                  for i in range(0, len(query_list), 6)]
+
+    results = {}
+    for (label, path), hybrid in ((item, hybrid) for item in artifact_dirs.items() for hybrid in hybrid_paths):
+        vectorizer_path = os.path.join(path, "disc_tfidf_vectorizer.pkl")
+        chunks_path = os.path.join(path, "disc_tfidf_chunks.pkl")
+        # Read by RetrievalArtifacts when it decides whether to load the vocabulary matrix
+        retrieval.USE_VOCAB_MATRIX = HYBRID_PATHS[hybrid]
+        artifacts, artifact_load = measure_once(lambda: retrieval.RetrievalArtifacts(vectorizer_path, chunks_path))
+        retrieval._publish_artifacts(artifacts)
+
+        # Warm up caches (token cache, page cache for memory-mapped files)
+        for text, qid in query_list[:10]:
+            retrieval.score_answer(text, qid, n=4)
+
+        key = f"{label}:{hybrid}"
+        results[key] = {
+            "corpus": label,
+            "hybrid": hybrid,
+            "chunks": len(artifacts.chunk_store),
+            "stages": {
+                "model_load": model_load,
+                "retrieval_import": import_stats,
+                "artifact_load": artifact_load,
+                "build_hybrid_vector": measure(retrieval.build_hybrid_vector, answer_args),
+                "get_max_similarity": measure(retrieval.get_max_similarity, scored_args),
+                "retrieve_top_n": measure(lambda t, q: retrieval.retrieve_top_n(t, q, n=4), scored_args),
+                "score_answer": measure(lambda t, q: retrieval.score_answer(t, q, n=4), scored_args),
+                "retrieve_top_n_batch": measure(retrieval.retrieve_top_n_batch, batch_args),
+            },
+        }
+        if label in build_s:
+            results[key]["build_s"] = build_s[label]
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": backend,
+            "vector_dtype": vector_dtype,
+            "hybrid_paths": hybrid_paths,
+            "queries": queries,
+        },
+        "results": results,
+    }
+
+def print_report(report: dict, baseline: dict = None):
+    for label, result in report["results"].items():
+        print(f"\n== corpus {result.get('corpus', label)}, {result.get('hybrid', '?')} hybrid path "
+              f"({result['chunks']} chunks) ==")
+        print(f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/cpu-s':>13}{'py peak MB':>12}"
+              + (f"{'p50 vs base':>13}" if baseline else ""))
+        for stage, stats in result["stages"].items():
+            line = (f"{stage:<22}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+                    f"{(stats['throughput_per_core'] or 0):>13.1f}{stats['py_peak_mb']:>12.2f}")
+            if baseline:
+                base = baseline.get("results", {}).get(label, {}).get("stages", {}).get(stage)
+                line += f"{stats['p50_ms'] / base['p50_ms']:>12.2f}x" if base and base["p50_ms"] else f"{'-':>13}"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval micro-benchmarks.")
+    parser.add_argument("--sizes", default="500,5000", help="comma-separated synthetic corpus sizes")
+    parser.add_argument("--artifacts", default=None, help="use this build_index.py folder instead of synthetic corpora")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--workers", type=int, default=1, help="build_index workers for synthetic corpora")
+    parser.add_argument("--vector-dtype", default="float32")
+    parser.add_argument("--hybrid", default="both", choices=[*HYBRID_PATHS, "both"],
+                        help="answer vector path to measure")
+    parser.add_argument("--json", default=None, help="write the full report to this path")
+    parser.add_argument("--compare", default=None, help="baseline JSON from another commit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="disc_bench_") as work_dir:
+        report = run([int(s) for s in args.sizes.split(",") if s], args.queries, args.backend, args.workers,
+                     args.vector_dtype, work_dir, args.artifacts,
+                     list(HYBRID_PATHS) if args.hybrid == "both" else [args.hybrid])
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
@@ -0,0 +1,207 @@
+# build_index.py
+import argparse
+import csv
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from chunk_store import store_dir_for, write_chunk_store
+from embedding_backends import BACKEND_NAMES, MODEL_NAME, load_embedding_backend
+from vector_index import HYBRID_METHOD_ATTR, VECTOR_DTYPES, normalise_rows
+
+###############################################################################
+# Retrieval Index Builder
+###############################################################################
+# Builds the artifacts retrieval.py loads from labelled source answers:
+#
+#   python build_index.py answers.csv --out build/ --workers 4
+#
+# answers.csv needs the columns question_id, type (D/I/S/C) and text.
+# Output goes to build/<version>/:
+#   disc_tfidf_vectorizer.pkl            fitted TfidfVectorizer
+#   disc_tfidf_chunks.pkl                list of chunk dicts (current format)
+#   disc_tfidf_chunks[_<dtype>]/         columnar chunk store (chunk_store.py); the
+#                                        suffix is _float16 / _int8 for compact dtypes
+#   disc_tfidf_vectorizer_vocab_matrix_<backend>.npy
+#   manifest.json                        version, inputs, counts, hashes, timings
+#
+# A chunk's hybrid vector is built the same way as an answer's on the matmul
+# path in retrieval.py: its TF-IDF row times the vocabulary embedding matrix,
+# L2-normalised. The pickled vectorizer is marked "matmul" so retrieval.py
+# picks that path for these artifacts. Vocabulary terms are encoded in batches spread over a
+# process pool, one model per worker.
+###############################################################################
+
+def preprocess_text(text: str) -> str:
+    # Must stay in step with retrieval.preprocess_text_for_retrieval
+    return text.lower()
+
+def read_source_answers(path: str) -> list:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    missing = {"question_id", "type", "text"} - set(rows[0].keys() if rows else [])
+    if missing:
+        raise ValueError(f"{path} is missing columns: {sorted(missing)}")
+    return [
+        {"question_id": r["question_id"].strip(), "type": r["type"].strip().upper(), "text": r["text"]}
+        for r in rows if r["text"] and r["text"].strip()
+    ]
+
+###############################################################################
+# Parallel vocabulary encoding
+###############################################################################
+_worker_backend = None
+
+def _init_worker(backend_name: str, threads: int):
+    global _worker_backend
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_backend = load_embedding_backend(backend_name, MODEL_NAME)
+
+def _encode_shard(args):
+    start, terms, batch_size = args
+    return start, _worker_backend.encode(terms, batch_size=batch_size, convert_to_numpy=True)
+
+def encode_terms(terms: list, backend_name: str, workers: int, batch_size: int) -> np.ndarray:
+    """(len(terms), dim) float32 embeddings, encoded in shards across `workers` processes."""
+    if workers <= 1:
+        backend = load_embedding_backend(backend_name, MODEL_NAME)
+        return np.asarray(backend.encode(terms, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+
+    # Several shards per worker keeps the pool busy when shards finish unevenly
+    shard_size = max(batch_size, -(-len(terms) // (workers * 4)))
+    shards = [(start, terms[start:start + shard_size], batch_size) for start in range(0, len(terms), shard_size)]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    results = {}
+    context = multiprocessing.get_context("spawn")  # torch is not fork-safe
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(backend_name, threads)) as pool:
+        for start, embeddings in pool.map(_encode_shard, shards):
+            results[start] = embeddings
+    return np.vstack([results[start] for start, _, _ in shards]).astype(np.float32)
+
+###############################################################################
+# Build
+###############################################################################
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def build_index(source_path: str, out_root: str, backend_name: str = "torch", workers: int = 1,
+                batch_size: int = 256, vector_dtype: str = "float32", max_features: int = None,
+                min_df: int = 1) -> dict:
+    timings = {}
+    started = time.perf_counter()
+
+    t0 = time.perf_counter()
+    records = read_source_answers(source_path)
+    if not records:
+        raise ValueError(f"No answers found in {source_path}")
+    texts = [preprocess_text(r["text"]) for r in records]
+    timings["read_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vectorizer = TfidfVectorizer(max_features=max_features, min_df=min_df)
+    tfidf = vectorizer.fit_transform(texts)
+    timings["tfidf_fit_s"] = time.perf_counter() - t0
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, index in vectorizer.vocabulary_.items():
+        terms[index] = term
+
+    t0 = time.perf_counter()
+    vocab_matrix = encode_terms(terms, backend_name, workers, batch_size)
+    timings["encode_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hybrid_vectors = normalise_rows(np.asarray(tfidf @ vocab_matrix))
+    timings["hybrid_s"] = time.perf_counter() - t0
+
+    source_sha = _sha256(source_path)
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{source_sha[:8]}"
+    out_dir = os.path.join(out_root, version)
+    os.makedirs(out_dir, exist_ok=True)
+
+    t0 = time.perf_counter()
+    chunks = [
+        {"question_id": r["question_id"], "type": r["type"], "text": r["text"], "hybrid_vector": vec}
+        for r, vec in zip(records, hybrid_vectors)
+    ]
+    vectorizer_file = os.path.join(out_dir, "disc_tfidf_vectorizer.pkl")
+    chunks_file = os.path.join(out_dir, "disc_tfidf_chunks.pkl")
+    vocab_matrix_file = os.path.join(out_dir, f"disc_tfidf_vectorizer_vocab_matrix_{backend_name}.npy")
+    # Tells retrieval.py to build query vectors the same way, wherever the pickle ends up
+    setattr(vectorizer, HYBRID_METHOD_ATTR, "matmul")
+    with open(vectorizer_file, "wb") as f:
+        pickle.dump(vectorizer, f)
+    with open(chunks_file, "wb") as f:
+        pickle.dump(chunks, f)
+    np.save(vocab_matrix_file, vocab_matrix)
+    # Same naming rule retrieval.py loads by, so a store is only found for its own dtype
+    write_chunk_store(chunks, store_dir_for(chunks_file, vector_dtype), vector_dtype)
+    timings["write_s"] = time.perf_counter() - t0
+    timings["total_s"] = time.perf_counter() - started
+
+    counts = {}
+    for r in records:
+        counts.setdefault(r["question_id"], {}).setdefault(r["type"], 0)
+        counts[r["question_id"]][r["type"]] += 1
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source": {"path": os.path.abspath(source_path), "sha256": source_sha, "answers": len(records)},
+        "model": MODEL_NAME,
+        "backend": backend_name,
+        "dim": int(vocab_matrix.shape[1]),
+        "vocabulary_size": len(terms),
+        "vector_dtype": vector_dtype,
+        "hybrid_method": "matmul",
+        "workers": workers,
+        "counts_by_question_and_type": counts,
+        "files": {
+            os.path.basename(p): _sha256(p) for p in (vectorizer_file, chunks_file, vocab_matrix_file)
+        },
+        "timings": timings,
+        "throughput": {
+            "terms_encoded_per_s": len(terms) / timings["encode_s"] if timings["encode_s"] else None,
+            "answers_per_s": len(records) / timings["total_s"] if timings["total_s"] else None,
+        },
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"Built version {version} in {out_dir}")
+    print(f"  answers: {len(records)}, vocabulary: {len(terms)}, dim: {manifest['dim']}")
+    print(f"  encode: {timings['encode_s']:.2f}s ({manifest['throughput']['terms_encoded_per_s']:.0f} terms/s "
+          f"over {workers} worker(s)), total: {timings['total_s']:.2f}s "
+          f"({manifest['throughput']['answers_per_s']:.0f} answers/s)")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build DiSC retrieval artifacts from labelled answers.")
+    parser.add_argument("source", help="CSV with question_id, type and text columns")
+    parser.add_argument("--out", default="build", help="output root; each build gets its own version folder")
+    parser.add_argument("--backend", default="torch", choices=BACKEND_NAMES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--vector-dtype", default="float32", choices=VECTOR_DTYPES)
+    parser.add_argument("--max-features", type=int, default=None)
+    parser.add_argument("--min-df", type=int, default=1)
+    args = parser.parse_args()
+    build_index(args.source, args.out, args.backend, args.workers, args.batch_size,
+                args.vector_dtype, args.max_features, args.min_df)
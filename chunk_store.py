@@ -0,0 +1,209 @@
+# chunk_store.py
+import json
+import os
+import pickle
+import sys
+import time
+import uuid
+import numpy as np
+from vector_index import VECTOR_DTYPES, quantise_rows
+
+###############################################################################
+# Columnar Chunk Store
+###############################################################################
+# A chunk store is a directory of .npy files that can be memory-mapped:
+#
+#   vectors.npy          (N, dim) L2-normalised hybrid vectors, rows grouped
+#                        by question (contiguous per question); float32, or
+#                        float16 / int8 when written with a compact vector_dtype
+#   vector_scales.npy    (N,) float32 per-row scales (int8 stores only)
+#   question_codes.npy   (N,) int32, index into meta["question_ids"]
+#   type_codes.npy       (N,) int8,  index into meta["types"]
+#   chunk_ids.npy        (N,) int64, position of the chunk in the source list
+#   text_offsets.npy     (N + 1,) int64, byte offsets into text.npy
+#   text.npy             UTF-8 bytes of every chunk text, concatenated
+#   meta.json            labels, per-question row ranges and format version
+###############################################################################
+FORMAT_VERSION = 1
+
+class ColumnarChunks:
+    """Read-only, memory-mapped view of a chunk store directory."""
+    def __init__(self, path: str, mmap_mode="r"):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store version in {path}: {self.meta.get('format_version')}")
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+
+        self.vectors = load("vectors.npy")
+        self.vector_dtype = self.meta.get("vector_dtype", "float32")
+        scales_path = os.path.join(path, "vector_scales.npy")
+        self.vector_scales = load("vector_scales.npy") if os.path.exists(scales_path) else None
+        self.question_codes = load("question_codes.npy")
+        self.type_codes = load("type_codes.npy")
+        self.chunk_ids = load("chunk_ids.npy")
+        self.text_offsets = load("text_offsets.npy")
+        self.text_bytes = load("text.npy")
+        self.question_ids = self.meta["question_ids"]
+        self.types = self.meta["types"]
+        # {question_id: [start, stop)} row range inside vectors
+        self.question_ranges = {q: tuple(r) for q, r in self.meta["question_ranges"].items()}
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def question_id(self, row: int) -> str:
+        return self.question_ids[self.question_codes[row]]
+
+    def type(self, row: int) -> str:
+        return self.types[self.type_codes[row]]
+
+    def text(self, row: int) -> str:
+        start, stop = self.text_offsets[row], self.text_offsets[row + 1]
+        return bytes(self.text_bytes[start:stop]).decode("utf-8")
+
+    def record(self, row: int) -> dict:
+        """The chunk at `row` as a plain dict (without its vector)."""
+        return {
+            "chunk_id": int(self.chunk_ids[row]),
+            "question_id": self.question_id(row),
+            "type": self.type(row),
+            "text": self.text(row),
+        }
+
+def write_chunk_store(records, out_dir: str, vector_dtype: str = "float32"):
+    """
+    Write a chunk store from an iterable of dicts with "question_id", "type",
+    "hybrid_vector" and (optionally) "text". Rows are grouped by question_id
+    in first-seen order; chunk ids are the positions in `records`.
+    vector_dtype is one of "float32", "float16" or "int8" (per-row scaled).
+    """
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype {vector_dtype!r}; expected one of {VECTOR_DTYPES}")
+    started = time.time()
+    records = list(records)
+    question_ids = list(dict.fromkeys(r["question_id"] for r in records))
+    types = sorted({r["type"] for r in records})
+    question_code = {q: i for i, q in enumerate(question_ids)}
+    type_code = {t: i for i, t in enumerate(types)}
+
+    # Stable grouping by question keeps the original order inside a question
+    order = sorted(range(len(records)), key=lambda i: question_code[records[i]["question_id"]])
+
+    if records:
+        vectors = np.vstack([np.asarray(records[i]["hybrid_vector"], dtype=np.float32) for i in order])
+    else:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    question_codes = np.array([question_code[records[i]["question_id"]] for i in order], dtype=np.int32)
+    type_codes = np.array([type_code[records[i]["type"]] for i in order], dtype=np.int8)
+    chunk_ids = np.array(order, dtype=np.int64)
+
+    encoded = [str(records[i].get("text", "")).encode("utf-8") for i in order]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+    text_bytes = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    question_ranges = {}
+    for q, code in question_code.items():
+        rows = np.flatnonzero(question_codes == code)
+        question_ranges[q] = [int(rows[0]), int(rows[-1]) + 1]
+
+    # Write into a sibling temp dir unique to this writer, then swap it in so
+    # readers never see half a store and concurrent writers never share a dir
+    tmp_dir = _sibling_dir(out_dir, "tmp")
+    os.makedirs(tmp_dir)
+    vectors, scales = quantise_rows(vectors, vector_dtype)
+    np.save(os.path.join(tmp_dir, "vectors.npy"), np.ascontiguousarray(vectors))
+    if scales is not None:
+        np.save(os.path.join(tmp_dir, "vector_scales.npy"), scales)
+    np.save(os.path.join(tmp_dir, "question_codes.npy"), question_codes)
+    np.save(os.path.join(tmp_dir, "type_codes.npy"), type_codes)
+    np.save(os.path.join(tmp_dir, "chunk_ids.npy"), chunk_ids)
+    np.save(os.path.join(tmp_dir, "text_offsets.npy"), text_offsets)
+    np.save(os.path.join(tmp_dir, "text.npy"), text_bytes)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "count": len(records),
+            "dim": int(vectors.shape[1]) if records else 0,
+            "vector_dtype": vector_dtype,
+            "question_ids": question_ids,
+            "types": types,
+            "question_ranges": question_ranges,
+        }, f, ensure_ascii=False, indent=2)
+
+    if _published_since(out_dir, started):
+        # Another process converted the same source while we were writing
+        _remove_store_dir(tmp_dir)
+        print(f"{out_dir} was written by another process; keeping it.")
+        return
+    old_dir = None
+    if os.path.exists(out_dir):
+        old_dir = _sibling_dir(out_dir, "old")
+        try:
+            os.replace(out_dir, old_dir)
+        except FileNotFoundError:
+            old_dir = None
+    try:
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        # Lost the race to publish: out_dir is now someone else's complete store
+        if not os.path.exists(os.path.join(out_dir, "meta.json")):
+            raise
+        _remove_store_dir(tmp_dir)
+        print(f"{out_dir} was written by another process; keeping it.")
+    else:
+        print(f"Wrote {len(records)} chunks to {out_dir}.")
+    if old_dir is not None:
+        _remove_store_dir(old_dir)
+
+def _sibling_dir(out_dir: str, suffix: str) -> str:
+    return f"{out_dir.rstrip('/' + os.sep)}.{os.getpid()}.{uuid.uuid4().hex[:8]}.{suffix}"
+
+def _published_since(out_dir: str, started: float) -> bool:
+    try:
+        return os.path.getmtime(os.path.join(out_dir, "meta.json")) >= started
+    except OSError:
+        return False
+
+def _remove_store_dir(path: str):
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+    os.rmdir(path)
+
+def convert_chunks_pickle(pickle_path: str, out_dir: str, vector_dtype: str = "float32"):
+    """Convert a pickled list-of-dicts chunk file into a chunk store."""
+    with open(pickle_path, "rb") as f:
+        records = pickle.load(f)
+    write_chunk_store(records, out_dir, vector_dtype)
+
+def store_dir_for(pickle_path: str, vector_dtype: str = "float32") -> str:
+    """<pickle without .pkl> for float32, with a _float16 / _int8 suffix otherwise."""
+    return os.path.splitext(pickle_path)[0] + ("" if vector_dtype == "float32" else f"_{vector_dtype}")
+
+def is_store_current(pickle_path: str, store_dir: str) -> bool:
+    """True if store_dir exists and is at least as new as pickle_path."""
+    meta_path = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    if not os.path.exists(pickle_path):
+        return True
+    return os.path.getmtime(meta_path) >= os.path.getmtime(pickle_path)
+
+
+if __name__ == "__main__":
+    # python chunk_store.py local_disc_tfidf_chunks.pkl local_disc_tfidf_chunks [float16|int8]
+    if len(sys.argv) not in (3, 4):
+        print("usage: python chunk_store.py <chunks.pkl> <out_dir> [float32|float16|int8]")
+        sys.exit(1)
+    convert_chunks_pickle(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else "float32")
@@ -0,0 +1,166 @@
+# compact_results.py
+import argparse
+import io
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import pandas as pd
+
+from results_loader import (
+    SNAPSHOT_FORMAT_VERSION, SOURCE_COLUMN, read_snapshot_manifest, snapshot_manifest_path, snapshot_prefix_for,
+)
+
+###############################################################################
+# Results Compaction (per-candidate CSV blobs -> date-partitioned Parquet)
+###############################################################################
+# Folds every CSV under a prefix (disc_results/, (answers_result)/) into one
+# Parquet part per creation date, so readers do a handful of bulk GETs
+# instead of one per candidate:
+#
+#   compacted/<prefix>date=YYYY-MM-DD/part-<run id>.parquet
+#   compacted/<prefix>manifest.json
+#     {"format_version", "source_prefix", "updated_at",
+#      "partitions": {date: {"path", "rows"}},
+#      "sources":    {blob name: {"generation", "date"}}}
+#
+# Each row carries its source blob name (SOURCE_COLUMN), so a source that is
+# overwritten or deleted is replaced or dropped on the next run. Only the
+# dates touched by new, changed or deleted sources are rewritten. The
+# manifest is written last, conditionally on the generation that was read,
+# so a concurrent run fails instead of losing rows. Superseded parts are
+# deleted once older than --gc-grace-s, giving readers of the previous
+# manifest time to finish. Source CSVs are left in place.
+#
+#   python compact_results.py --prefix disc_results/ --prefix "(answers_result)/"
+###############################################################################
+BUCKET_NAME = "streamlit-disc-candidate-bucket"
+DEFAULT_PREFIXES = ("disc_results/", "(answers_result)/")
+
+def create_storage_client(credentials_file: str = None):
+    from google.cloud import storage
+    if credentials_file:
+        return storage.Client.from_service_account_json(credentials_file)
+    return storage.Client()
+
+def _list_sources(client, bucket_name: str, prefix: str) -> dict:
+    """{blob name: (generation, creation date)} for every CSV under the prefix."""
+    blobs = client.list_blobs(bucket_name, prefix=prefix, fields="items(name,generation,timeCreated),nextPageToken")
+    return {
+        blob.name: (int(blob.generation), blob.time_created.astimezone(timezone.utc).strftime("%Y-%m-%d"))
+        for blob in blobs if blob.name.endswith(".csv")
+    }
+
+def _read_source(client, bucket_name: str, name: str, generation: int) -> pd.DataFrame:
+    data = client.bucket(bucket_name).blob(name, generation=generation).download_as_bytes()
+    return pd.read_csv(io.BytesIO(data)).assign(**{SOURCE_COLUMN: name})
+
+def _to_parquet_bytes(frame: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    try:
+        frame.to_parquet(buffer, index=False)
+    except Exception:
+        # Columns whose type differs between source files are stored as text
+        buffer = io.BytesIO()
+        frame.astype({c: str for c in frame.columns if frame[c].dtype == object}).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def compact_prefix(client, bucket_name: str, prefix: str, workers: int = 16, gc_grace_s: float = 3600) -> dict:
+    """Bring the snapshot of `prefix` up to date. Returns a summary of what changed."""
+    started = time.perf_counter()
+    bucket = client.bucket(bucket_name)
+    manifest, manifest_generation = read_snapshot_manifest(client, bucket_name, prefix)
+    if manifest is None:
+        manifest = {"format_version": SNAPSHOT_FORMAT_VERSION, "source_prefix": prefix, "partitions": {}, "sources": {}}
+
+    listed = _list_sources(client, bucket_name, prefix)
+    compacted = manifest["sources"]
+    new_or_changed = {name: v for name, v in listed.items()
+                      if compacted.get(name, {}).get("generation") != v[0]}
+    removed = [name for name in compacted if name not in listed]
+    summary = {"prefix": prefix, "sources": len(listed), "added_or_changed": len(new_or_changed),
+               "removed": len(removed), "partitions_written": 0}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(new_or_changed) or 1))) as pool:
+        futures = {name: pool.submit(_read_source, client, bucket_name, name, generation)
+                   for name, (generation, _) in new_or_changed.items()}
+        new_frames = {name: future.result() for name, future in futures.items()}
+    # Header-only files have no rows to fold in. They stay out of the manifest,
+    # so readers keep fetching them individually.
+    empty_sources = {name for name, frame in new_frames.items() if frame.empty}
+
+    # Dates to rewrite: where new rows go, and where replaced/removed rows were
+    stale_sources = set(removed) | {name for name in new_or_changed if name in compacted}
+    dates = ({date for name, (_, date) in new_or_changed.items() if name not in empty_sources}
+             | {compacted[name]["date"] for name in stale_sources})
+    if not dates:
+        summary["seconds"] = time.perf_counter() - started
+        print(f"{prefix}: snapshot already up to date ({len(listed)} files).")
+        return summary
+
+    run_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    partitions = dict(manifest["partitions"])
+    for date in sorted(dates):
+        frames = []
+        old = partitions.get(date)
+        if old is not None:
+            existing = pd.read_parquet(io.BytesIO(bucket.blob(old["path"]).download_as_bytes()))
+            frames.append(existing[~existing[SOURCE_COLUMN].isin(stale_sources)])
+        frames += [new_frames[name] for name in sorted(new_frames)
+                   if name not in empty_sources and new_or_changed[name][1] == date]
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if frame.empty:
+            partitions.pop(date, None)
+            continue
+        path = f"{snapshot_prefix_for(prefix)}date={date}/part-{run_id}.parquet"
+        bucket.blob(path).upload_from_string(_to_parquet_bytes(frame), content_type="application/octet-stream")
+        partitions[date] = {"path": path, "rows": len(frame)}
+        summary["partitions_written"] += 1
+
+    sources = {name: v for name, v in compacted.items() if name not in stale_sources}
+    sources.update({name: {"generation": generation, "date": date}
+                    for name, (generation, date) in new_or_changed.items() if name not in empty_sources})
+    manifest.update({
+        "partitions": partitions,
+        "sources": sources,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    # 0 = "must not exist yet" for a first snapshot
+    bucket.blob(snapshot_manifest_path(prefix)).upload_from_string(
+        json.dumps(manifest, ensure_ascii=False, indent=2), content_type="application/json",
+        if_generation_match=manifest_generation or 0,
+    )
+
+    summary["deleted_parts"] = _delete_unreferenced_parts(client, bucket_name, prefix, partitions, gc_grace_s)
+    summary["seconds"] = time.perf_counter() - started
+    print(f"{prefix}: compacted {len(new_or_changed)} new/changed and {len(removed)} removed file(s) "
+          f"into {summary['partitions_written']} partition(s) in {summary['seconds']:.1f}s.")
+    return summary
+
+def _delete_unreferenced_parts(client, bucket_name: str, prefix: str, partitions: dict, gc_grace_s: float) -> int:
+    referenced = {partition["path"] for partition in partitions.values()}
+    cutoff = time.time() - gc_grace_s
+    deleted = 0
+    for blob in client.list_blobs(bucket_name, prefix=snapshot_prefix_for(prefix) + "date="):
+        if blob.name in referenced or blob.updated.timestamp() > cutoff:
+            continue
+        blob.delete()
+        deleted += 1
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact per-candidate result CSVs into Parquet snapshots.")
+    parser.add_argument("--bucket", default=BUCKET_NAME)
+    parser.add_argument("--prefix", action="append", default=None,
+                        help=f"source prefix to compact (repeatable; default: {', '.join(DEFAULT_PREFIXES)})")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--gc-grace-s", type=float, default=3600,
+                        help="keep superseded parts at least this long for readers of the previous manifest")
+    parser.add_argument("--credentials", default=None, help="service account JSON (default: application default credentials)")
+    args = parser.parse_args()
+
+    storage_client = create_storage_client(args.credentials)
+    for source_prefix in args.prefix or DEFAULT_PREFIXES:
+        compact_prefix(storage_client, args.bucket, source_prefix, args.workers, args.gc_grace_s)
@@ -0,0 +1,278 @@
+# embedding_backends.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+###############################################################################
+# Embedding Backends
+###############################################################################
+# Every backend exposes the two SentenceTransformer methods retrieval.py uses,
+# so it can be dropped in wherever `model` is expected:
+#   encode(texts, batch_size=32, convert_to_numpy=True) -> (n, dim) float32
+#   get_sentence_embedding_dimension() -> int
+#
+# Backends:
+#   "torch"      the original PyTorch SentenceTransformer
+#   "onnx"       the same model exported to ONNX, run with onnxruntime
+#   "onnx-int8"  the ONNX export with dynamically quantised int8 weights
+#
+# The ONNX backends need `onnxruntime` and `transformers` (exporting also
+# needs `torch`); they are imported only when one of them is selected.
+###############################################################################
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # same as the SentenceTransformer config for this model
+
+BACKEND_NAMES = ("torch", "onnx", "onnx-int8")
+
+# Micro-batching of concurrent encode calls (see MicroBatchingBackend)
+ENCODE_MAX_BATCH = int(os.environ.get("DISC_ENCODE_MAX_BATCH", "64"))
+ENCODE_MAX_WAIT_MS = float(os.environ.get("DISC_ENCODE_MAX_WAIT_MS", "5"))
+
+class TorchEmbeddingBackend:
+    name = "torch"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=convert_to_numpy, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+class OnnxEmbeddingBackend:
+    """
+    Runs the exported transformer with onnxruntime on CPU, then applies the
+    same mean pooling and L2 normalisation as the SentenceTransformer pipeline.
+    """
+    def __init__(self, model_name: str = MODEL_NAME, model_dir: str = None, quantize: bool = True):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.name = "onnx-int8" if quantize else "onnx"
+        model_dir = model_dir or os.path.join("artifact_cache", "onnx", model_name.replace("/", "__"))
+        onnx_path = export_onnx_model(model_name, model_dir, quantize=quantize)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = int(self.session.get_outputs()[0].shape[-1])
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        texts = list(texts)
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=MAX_SEQ_LENGTH, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        embeddings = np.vstack(batches) if batches else np.zeros((0, self._dim), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+def export_onnx_model(model_name: str, model_dir: str, quantize: bool = True) -> str:
+    """
+    Export `model_name` to <model_dir>/model.onnx (and model.int8.onnx when
+    quantising) unless already present. Returns the path to load.
+    """
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    target_path = int8_path if quantize else fp32_path
+    if os.path.exists(target_path):
+        return target_path
+
+    os.makedirs(model_dir, exist_ok=True)
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        hf_model = AutoModel.from_pretrained(model_name)
+        hf_model.eval()
+        dummy = AutoTokenizer.from_pretrained(model_name)(["an example answer"], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        tmp_path = f"{fp32_path}.{os.getpid()}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                hf_model,
+                tuple(dummy[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        os.replace(tmp_path, fp32_path)
+        print(f"Exported {model_name} to {fp32_path}.")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = f"{int8_path}.{os.getpid()}.tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+        print(f"Quantised {fp32_path} to {int8_path}.")
+    return target_path
+
+def load_embedding_backend(name: str = "torch", model_name: str = MODEL_NAME, model_dir: str = None):
+    """Build the backend called `name` (one of BACKEND_NAMES)."""
+    if name == "torch":
+        return TorchEmbeddingBackend(model_name)
+    if name == "onnx":
+        return OnnxEmbeddingBackend(model_name, model_dir, quantize=False)
+    if name == "onnx-int8":
+        return OnnxEmbeddingBackend(model_name, model_dir, quantize=True)
+    raise ValueError(f"Unknown embedding backend {name!r}; expected one of {BACKEND_NAMES}")
+
+###############################################################################
+# Micro-batching
+###############################################################################
+# Concurrent sessions calling encode() with a handful of tokens each make the
+# model run many tiny batches in parallel threads, which thrashes the CPU.
+# MicroBatchingBackend puts every call on a queue; one worker thread takes
+# the first waiting call, keeps collecting more for up to max_wait_ms (or
+# until max_batch_size texts), encodes the distinct texts as one batch and
+# hands each caller its rows. With max_wait_ms=0 it still merges whatever is
+# already queued, and the model only ever runs on one thread.
+#
+# A call larger than max_batch_size (e.g. the whole vocabulary) is queued one
+# slice at a time, so request-path calls get in between its slices. If a
+# merged batch fails, each call in it is retried alone and only the calls
+# that still fail get the exception.
+
+class MicroBatchingBackend:
+    def __init__(self, backend, max_batch_size: int = ENCODE_MAX_BATCH, max_wait_ms: float = ENCODE_MAX_WAIT_MS):
+        self.backend = backend
+        self.name = backend.name
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="disc-encode-batcher", daemon=True)
+        self._worker.start()
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        if kwargs:
+            # Options the batcher does not merge (e.g. normalize_embeddings) go straight through
+            return self.backend.encode(texts, batch_size=batch_size, convert_to_numpy=convert_to_numpy, **kwargs)
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        parts = []
+        for start in range(0, len(texts), self.max_batch_size):
+            chunk = texts[start:start + self.max_batch_size]
+            future = Future()
+            with self._submit_lock:
+                closed = self._closed
+                if not closed:
+                    self._queue.put((chunk, future))
+            if closed:
+                parts.append(np.asarray(self.backend.encode(chunk, batch_size=batch_size, convert_to_numpy=True),
+                                        dtype=np.float32))
+            else:
+                parts.append(future.result())
+        embeddings = parts[0] if len(parts) == 1 else np.vstack(parts)
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.backend.get_sentence_embedding_dimension()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "mean_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    def close(self):
+        """Stop the worker once queued calls are done; later calls go straight to the backend."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+    def _collect(self) -> list:
+        """Waiting calls to encode together; None marks the close() sentinel."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.max_wait_s
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Nothing is queued after the sentinel: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    def _encode_batch(self, batch: list):
+        unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+        embeddings = np.asarray(
+            self.backend.encode(unique, batch_size=self.max_batch_size, convert_to_numpy=True),
+            dtype=np.float32,
+        )
+        row_of = {text: row for row, text in enumerate(unique)}
+        for texts, future in batch:
+            future.set_result(embeddings[[row_of[text] for text in texts]])
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # Find the bad call(s): everyone else still gets their rows
+                    for item in batch:
+                        if item[1].done():
+                            continue
+                        try:
+                            self._encode_batch([item])
+                        except Exception as item_error:
+                            item[1].set_exception(item_error)
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += sum(len(texts) for texts, _ in batch)
+
+def with_micro_batching(backend, max_batch_size: int = ENCODE_MAX_BATCH, max_wait_ms: float = ENCODE_MAX_WAIT_MS):
+    """Wrap `backend` in a MicroBatchingBackend unless batching is disabled (max_batch_size <= 1)."""
+    if max_batch_size <= 1:
+        return backend
+    return MicroBatchingBackend(backend, max_batch_size, max_wait_ms)
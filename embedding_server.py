@@ -0,0 +1,274 @@
+# embedding_server.py
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+
+from embedding_backends import BACKEND_NAMES, MODEL_NAME, load_embedding_backend, with_micro_batching
+
+###############################################################################
+# Local Embedding Server
+###############################################################################
+# One process holds the model and serves encode requests to every Streamlit
+# worker on the machine, so workers no longer each load their own copy:
+#
+#   python embedding_server.py --address /tmp/disc-embed.sock --backend torch
+#   DISC_EMBEDDING_SERVER=/tmp/disc-embed.sock streamlit run streamlit_app.py
+#
+# An address is a Unix socket path, or host:port for TCP on localhost.
+#
+# Wire format: every message is one or more frames of a 4-byte big-endian
+# length followed by that many bytes.
+#   request   1 frame:  JSON {"op": "encode", "texts": [...], "batch_size": 32}
+#                       or {"op": "info"}
+#   response  2 frames: JSON header ({"shape", "dtype"}, {"name", "dim"} or
+#                       {"error"}), then the raw float32 embeddings (may be empty)
+###############################################################################
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+# Client-side cap on texts per encode request, so large calls (e.g. building
+# the vocabulary matrix) finish well inside the socket timeout
+MAX_TEXTS_PER_REQUEST = int(os.environ.get("DISC_EMBEDDING_REQUEST_MAX_TEXTS", "256"))
+# Seconds a client uses its in-process fallback before trying the server again
+SERVER_RETRY_S = float(os.environ.get("DISC_EMBEDDING_SERVER_RETRY_S", "10"))
+
+def parse_address(address: str):
+    """(socket family, address) for '/path/to.sock', 'unix:/path' or 'host:port'."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    if address.startswith("/") or address.startswith("."):
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+def _recv_exact(sock, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("connection closed mid-frame")
+        received += n
+    return bytes(buf)
+
+def send_frame(sock, payload: bytes):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+def recv_frame(sock) -> bytes:
+    (size,) = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ConnectionError(f"frame of {size} bytes exceeds the limit")
+    return _recv_exact(sock, size)
+
+###############################################################################
+# Server
+###############################################################################
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Serves requests on one connection until the client closes it."""
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            try:
+                header, body = self.server.dispatch(request)
+            except Exception as e:
+                header, body = {"error": str(e)}, b""
+            send_frame(self.request, json.dumps(header).encode("utf-8"))
+            send_frame(self.request, body)
+
+class _EmbeddingServerMixin:
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def setup_backend(self, backend):
+        # Requests from all connections are merged into shared model batches
+        self.backend = with_micro_batching(backend)
+        self.dim = int(backend.get_sentence_embedding_dimension())
+
+    def encode(self, texts: list, batch_size: int) -> np.ndarray:
+        embeddings = self.backend.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def dispatch(self, request: dict):
+        op = request.get("op")
+        if op == "info":
+            return {"name": self.backend.name, "dim": self.dim}, b""
+        if op == "encode":
+            texts = [str(t) for t in request["texts"]]
+            if not texts:
+                return {"shape": [0, self.dim], "dtype": "float32"}, b""
+            embeddings = self.encode(texts, int(request.get("batch_size", 32)))
+            return {"shape": list(embeddings.shape), "dtype": "float32"}, embeddings.tobytes()
+        raise ValueError(f"Unknown op {op!r}")
+
+class UnixEmbeddingServer(_EmbeddingServerMixin, socketserver.ThreadingUnixStreamServer):
+    pass
+
+class TCPEmbeddingServer(_EmbeddingServerMixin, socketserver.ThreadingTCPServer):
+    pass
+
+def create_embedding_server(address: str, backend):
+    family, bind_address = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind_address):
+            os.remove(bind_address)  # stale socket from a previous run
+        server = UnixEmbeddingServer(bind_address, EmbeddingRequestHandler)
+    else:
+        server = TCPEmbeddingServer(bind_address, EmbeddingRequestHandler)
+    server.setup_backend(backend)
+    return server
+
+###############################################################################
+# Client
+###############################################################################
+class RemoteEmbeddingBackend:
+    """
+    Drop-in backend (encode / get_sentence_embedding_dimension) that sends
+    requests to an embedding server. Each thread keeps its own connection.
+    If the server becomes unreachable and `fallback` is given, the backend it
+    returns is loaded and used while the server is down; the server is tried
+    again every retry_s seconds, and once it answers the fallback is closed and
+    dropped so its memory can be freed. A timeout means the server is busy, not
+    gone: it is raised without a retry or fallback.
+    """
+    def __init__(self, address: str, timeout_s: float = 30.0, fallback=None,
+                 max_texts_per_request: int = MAX_TEXTS_PER_REQUEST, retry_s: float = SERVER_RETRY_S):
+        self.address = address
+        self.timeout_s = timeout_s
+        self.max_texts_per_request = max(1, max_texts_per_request)
+        self.retry_s = retry_s
+        self._fallback_factory = fallback
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+        self._down_until = 0.0
+        self._local = threading.local()
+        try:
+            info, _ = self._request({"op": "info"})
+        except (ConnectionError, OSError):
+            if fallback is None:
+                raise
+            # Start on the in-process model and keep trying the server
+            self._mark_down()
+            local = self._local_backend()
+            info = {"name": local.name, "dim": local.get_sentence_embedding_dimension()}
+        # Same name as the server's backend, so artifacts keyed by backend
+        # name (e.g. the vocabulary matrix) are shared with in-process use
+        self.name = info["name"]
+        self._dim = int(info["dim"])
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            family, address = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout_s)
+            sock.connect(address)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, request: dict):
+        payload = json.dumps(request).encode("utf-8")
+        # One retry on a fresh connection covers a server restart
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_frame(sock, payload)
+                header = json.loads(recv_frame(sock))
+                body = recv_frame(sock)
+                break
+            except socket.timeout:
+                # The reply may still arrive on this connection, so drop it;
+                # resending would only queue the same work again
+                self._close()
+                raise
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt == 1:
+                    raise
+        if "error" in header:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        return header, body
+
+    def _local_backend(self):
+        with self._fallback_lock:
+            if self._fallback is None:
+                print(f"Embedding server {self.address} unreachable; loading the model in-process.")
+                self._fallback = self._fallback_factory()
+            return self._fallback
+
+    def _mark_down(self):
+        with self._fallback_lock:
+            self._down_until = time.monotonic() + self.retry_s
+
+    def _drop_local_backend(self):
+        with self._fallback_lock:
+            fallback, self._fallback = self._fallback, None
+        if fallback is not None:
+            print(f"Embedding server {self.address} is back; unloading the in-process model.")
+            close = getattr(fallback, "close", None)
+            if close is not None:
+                close()
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if self._fallback_factory is not None and time.monotonic() < self._down_until:
+            embeddings = self._local_backend().encode(texts, batch_size=batch_size, convert_to_numpy=True)
+            return embeddings[0] if single else embeddings
+        try:
+            embeddings = self._encode_remote(texts, batch_size)
+        except socket.timeout:
+            raise
+        except (ConnectionError, OSError):
+            if self._fallback_factory is None:
+                raise
+            self._mark_down()
+            embeddings = self._local_backend().encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        else:
+            if self._fallback is not None:
+                self._drop_local_backend()
+        return embeddings[0] if single else embeddings
+
+    def _encode_remote(self, texts: list, batch_size: int) -> np.ndarray:
+        """Encode in requests of at most max_texts_per_request texts."""
+        parts = []
+        for start in range(0, max(1, len(texts)), self.max_texts_per_request):
+            request = {"op": "encode", "texts": texts[start:start + self.max_texts_per_request], "batch_size": batch_size}
+            header, body = self._request(request)
+            parts.append(np.frombuffer(body, dtype=np.float32).reshape(header["shape"]))
+        return parts[0] if len(parts) == 1 else np.vstack(parts)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve sentence embeddings to local app workers.")
+    parser.add_argument("--address", default=os.environ.get("DISC_EMBEDDING_SERVER", "/tmp/disc-embed.sock"),
+                        help="Unix socket path or host:port")
+    parser.add_argument("--backend", default=os.environ.get("DISC_EMBEDDING_BACKEND", "torch"), choices=BACKEND_NAMES)
+    args = parser.parse_args()
+
+    embedding_server = create_embedding_server(args.address, load_embedding_backend(args.backend, MODEL_NAME))
+    print(f"Serving {args.backend} embeddings (dim {embedding_server.dim}) on {args.address}.")
+    try:
+        embedding_server.serve_forever()
+    finally:
+        embedding_server.server_close()
@@ -0,0 +1,273 @@
+# golden_eval.py
+import argparse
+import copy
+import csv
+import json
+import sys
+import time
+import numpy as np
+
+import retrieval
+from embedding_backends import MODEL_NAME, load_embedding_backend
+from retrieval import (
+    ONNX_MODEL_DIR, ChunkIndex, check_backend_tolerance, disc_percentages, disc_totals, load_chunk_store,
+    load_vocab_matrix, store_path_for, vocab_matrix_path_for,
+)
+
+###############################################################################
+# Golden-set Regression Harness (accuracy + latency per retrieval engine)
+###############################################################################
+# Runs a labelled golden set through the reference engine and every faster
+# variant, and reports how far each variant drifts from the reference:
+#
+#   python golden_eval.py golden.csv --json golden_report.json --min-agreement 0.98
+#
+# golden.csv columns: candidate_id, question_id (Q1..Q6), answer, and
+# optionally expected_type (D/I/S/C) and expected_relevant (1/0).
+#
+# Per engine:
+#   top1_type_agreement   same effective (negation-switched) top-1 type as reference
+#   threshold_agreement   same is_relevant decision at --threshold
+#   candidate_*           disc_result_page percentages per candidate: max
+#                         percentage-point drift and primary-type agreement
+#   label accuracy        vs expected_type / expected_relevant when present
+#   ms_per_answer         wall time per answer (batched engines: total / count)
+#   backend_tolerance     onnx / onnx-int8 engines only: check_backend_tolerance
+#                         of their hybrid vectors against the PyTorch model;
+#                         below --min-cosine fails the run
+#
+# Artifacts come from the usual retrieval.py configuration (GCS, or
+# DISC_LOCAL_ARTIFACTS_DIR for a local build_index.py folder).
+###############################################################################
+REFERENCE_ENGINE = "baseline"
+
+def read_golden_set(path: str) -> list:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    missing = {"candidate_id", "question_id", "answer"} - set(rows[0].keys() if rows else [])
+    if missing:
+        raise ValueError(f"{path} is missing columns: {sorted(missing)}")
+    golden = []
+    for r in rows:
+        expected_relevant = (r.get("expected_relevant") or "").strip()
+        golden.append({
+            "candidate_id": r["candidate_id"].strip(),
+            "question_id": r["question_id"].strip(),
+            "answer": r["answer"],
+            "expected_type": (r.get("expected_type") or "").strip().upper() or None,
+            "expected_relevant": expected_relevant in ("1", "true", "True", "yes") if expected_relevant else None,
+        })
+    return golden
+
+###############################################################################
+# Engines
+###############################################################################
+# Each engine is a RetrievalArtifacts variant, a batched flag and an optional
+# embedding backend. Variants share the vectorizer and vocabulary with the
+# loaded version and only swap the pieces under test, so differences come
+# from the engine alone. Backend engines use the per-token path, like the
+# baseline, with the model swapped for that backend.
+
+def artifact_variant(base, vocab_matrix: bool = True, vector_dtype: str = "float32",
+                     ann: bool = False, ann_min_chunks: int = 0):
+    artifacts = copy.copy(base)
+    if not vocab_matrix:
+        artifacts.vocab_matrix = None
+    elif artifacts.vocab_matrix is None:
+        # Matmul engines are measured even when DISC_USE_VOCAB_MATRIX leaves it off
+        artifacts.vocab_matrix = load_vocab_matrix(vocab_matrix_path_for(base.vectorizer_path), base.vocab)
+    if base.chunk_store.vector_dtype == vector_dtype:
+        store = base.chunk_store
+    else:
+        store = load_chunk_store(base.chunks_path, store_path_for(base.chunks_path, vector_dtype), vector_dtype)
+    artifacts.chunk_store = store
+    artifacts.chunk_index = ChunkIndex(store, ann_enabled=ann, ann_min_chunks=ann_min_chunks)
+    return artifacts
+
+def backend_engine(base, backend_name: str):
+    backend = load_embedding_backend(backend_name, MODEL_NAME, ONNX_MODEL_DIR)
+    return artifact_variant(base, vocab_matrix=False), True, backend
+
+def build_engines(base, names: list, ann_min_chunks: int) -> dict:
+    """{name: (artifacts, batched, backend or None)} for the requested engine names."""
+    factories = {
+        # The original request path: per-token embeddings, float32, exact search
+        "baseline": lambda: (artifact_variant(base, vocab_matrix=False), False, None),
+        # Whatever the running configuration (env vars) uses
+        "current": lambda: (base, False, None),
+        "matmul": lambda: (artifact_variant(base), False, None),
+        "batched": lambda: (artifact_variant(base), True, None),
+        "float16": lambda: (artifact_variant(base, vector_dtype="float16"), False, None),
+        "int8": lambda: (artifact_variant(base, vector_dtype="int8"), False, None),
+        "ann": lambda: (artifact_variant(base, ann=True, ann_min_chunks=ann_min_chunks), False, None),
+        "onnx": lambda: backend_engine(base, "onnx"),
+        "onnx-int8": lambda: backend_engine(base, "onnx-int8"),
+    }
+    unknown = set(names) - set(factories)
+    if unknown:
+        raise ValueError(f"Unknown engines {sorted(unknown)}; expected some of {sorted(factories)}")
+    return {name: factories[name]() for name in names}
+
+def run_engine(artifacts, batched: bool, golden: list, n: int, backend=None) -> tuple:
+    """(top-n lists in golden order, seconds per answer)."""
+    answers = [g["answer"] for g in golden]
+    question_ids = [g["question_id"] for g in golden]
+    if batched:
+        t0 = time.perf_counter()
+        results = retrieval.retrieve_top_n_batch(answers, question_ids, n, artifacts=artifacts, backend=backend)
+        elapsed = time.perf_counter() - t0
+        return results, [elapsed / len(golden)] * len(golden)
+    results, latencies = [], []
+    for answer, question_id in zip(answers, question_ids):
+        t0 = time.perf_counter()
+        results.append(retrieval.retrieve_top_n(answer, question_id, n, artifacts=artifacts))
+        latencies.append(time.perf_counter() - t0)
+    return results, latencies
+
+def to_score(top: list, threshold: float) -> dict:
+    """The score_answer() view of a top-n list."""
+    max_sim = top[0][0] if top else 0.0
+    is_relevant = max_sim >= threshold
+    return {
+        "max_similarity": max_sim,
+        "is_relevant": is_relevant,
+        "similarities": top if is_relevant else [],
+        "top1_type": top[0][1]["type"] if top else None,
+    }
+
+def candidate_results(golden: list, scores: list) -> dict:
+    """{candidate_id: {"percentages", "best_type"}} as disc_result_page computes them."""
+    by_candidate = {}
+    for g, score in zip(golden, scores):
+        by_candidate.setdefault(g["candidate_id"], []).append(score["similarities"])
+    results = {}
+    for candidate_id, similarity_lists in by_candidate.items():
+        totals = disc_totals(similarity_lists)
+        results[candidate_id] = {
+            "percentages": disc_percentages(totals),
+            "best_type": max(totals, key=totals.get) if any(totals.values()) else None,
+        }
+    return results
+
+###############################################################################
+# Comparison
+###############################################################################
+def compare(golden: list, reference: list, scores: list, latencies: list) -> dict:
+    count = len(golden)
+    report = {
+        "answers": count,
+        "top1_type_agreement": sum(r["top1_type"] == s["top1_type"] for r, s in zip(reference, scores)) / count,
+        "threshold_agreement": sum(r["is_relevant"] == s["is_relevant"] for r, s in zip(reference, scores)) / count,
+        "max_similarity_drift_max": max(abs(r["max_similarity"] - s["max_similarity"]) for r, s in zip(reference, scores)),
+        "ms_per_answer_mean": 1000 * float(np.mean(latencies)),
+        "ms_per_answer_p95": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+    ref_candidates = candidate_results(golden, reference)
+    candidates = candidate_results(golden, scores)
+    drifts, same_best = [], 0
+    for candidate_id, ref in ref_candidates.items():
+        result = candidates[candidate_id]
+        same_best += ref["best_type"] == result["best_type"]
+        if ref["percentages"] is None or result["percentages"] is None:
+            drifts.append(0.0 if ref["percentages"] == result["percentages"] else 100.0)
+        else:
+            drifts.append(max(abs(ref["percentages"][t] - result["percentages"][t]) for t in ref["percentages"]))
+    report["candidates"] = len(ref_candidates)
+    report["candidate_best_type_agreement"] = same_best / len(ref_candidates)
+    report["candidate_pct_drift_max"] = max(drifts)
+    report["candidate_pct_drift_mean"] = float(np.mean(drifts))
+
+    labelled_type = [(g, s) for g, s in zip(golden, scores) if g["expected_type"]]
+    if labelled_type:
+        report["expected_type_accuracy"] = sum(g["expected_type"] == s["top1_type"] for g, s in labelled_type) / len(labelled_type)
+    labelled_relevance = [(g, s) for g, s in zip(golden, scores) if g["expected_relevant"] is not None]
+    if labelled_relevance:
+        report["expected_relevant_accuracy"] = (
+            sum(g["expected_relevant"] == s["is_relevant"] for g, s in labelled_relevance) / len(labelled_relevance)
+        )
+    return report
+
+def evaluate(golden: list, engine_names: list, n: int = 4, threshold: float = 0.4, ann_min_chunks: int = 0,
+             min_cosine: float = 0.99) -> dict:
+    if REFERENCE_ENGINE not in engine_names:
+        engine_names = [REFERENCE_ENGINE] + list(engine_names)
+    engines = build_engines(retrieval.current_artifacts(), engine_names, ann_min_chunks)
+
+    # One untimed pass per engine warms the token cache and memory-mapped pages
+    for artifacts, batched, backend in engines.values():
+        run_engine(artifacts, batched, golden[:20], n, backend)
+
+    reference = None
+    torch_backend = None
+    report = {}
+    for name in engine_names:
+        artifacts, batched, backend = engines[name]
+        tops, latencies = run_engine(artifacts, batched, golden, n, backend)
+        scores = [to_score(top, threshold) for top in tops]
+        if reference is None:
+            reference = scores
+        report[name] = compare(golden, reference, scores, latencies)
+        if backend is not None:
+            torch_backend = torch_backend or load_embedding_backend("torch", MODEL_NAME)
+            report[name]["backend_tolerance"] = check_backend_tolerance(
+                backend, [g["answer"] for g in golden], reference=torch_backend, min_cosine=min_cosine,
+            )
+    return report
+
+def print_report(report: dict):
+    columns = [
+        ("top1_type_agreement", "top1 agree"), ("threshold_agreement", "thresh agree"),
+        ("candidate_best_type_agreement", "best agree"), ("candidate_pct_drift_max", "pct drift"),
+        ("expected_type_accuracy", "type acc"), ("ms_per_answer_mean", "ms/answer"),
+    ]
+    print(f"{'engine':<10}" + "".join(f"{label:>14}" for _, label in columns) + f"{'min cosine':>14}")
+    for name, result in report.items():
+        cells = "".join(f"{result[key]:>14.3f}" if key in result else f"{'-':>14}" for key, _ in columns)
+        tolerance = result.get("backend_tolerance")
+        cells += f"{tolerance['min_cosine']:>14.4f}" if tolerance else f"{'-':>14}"
+        print(f"{name:<10}{cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare retrieval engines on a labelled golden set.")
+    parser.add_argument("golden", help="CSV with candidate_id, question_id, answer[, expected_type, expected_relevant]")
+    parser.add_argument("--engines", default="baseline,current,matmul,batched,float16,int8,ann",
+                        help="comma-separated; onnx and onnx-int8 are also available (need onnxruntime)")
+    parser.add_argument("--n", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.4)
+    parser.add_argument("--ann-min-chunks", type=int, default=0, help="build IVF for questions with at least this many chunks")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="exit 1 if any engine's top-1 or threshold agreement falls below this")
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="backend engines fail when any hybrid vector's cosine to PyTorch is below this")
+    parser.add_argument("--json", default=None, help="write the full report to this path")
+    args = parser.parse_args()
+
+    golden_set = read_golden_set(args.golden)
+    result_report = evaluate(golden_set, [e for e in args.engines.split(",") if e], args.n, args.threshold,
+                             args.ann_min_chunks, args.min_cosine)
+    print_report(result_report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result_report, f, indent=2)
+        print(f"Wrote {args.json}")
+
+    failed = False
+    out_of_tolerance = [
+        name for name, result in result_report.items()
+        if "backend_tolerance" in result and not result["backend_tolerance"]["within_tolerance"]
+    ]
+    if out_of_tolerance:
+        print(f"Below {args.min_cosine} cosine to PyTorch: {', '.join(out_of_tolerance)}")
+        failed = True
+    if args.min_agreement is not None:
+        failing = [
+            name for name, result in result_report.items()
+            if min(result["top1_type_agreement"], result["threshold_agreement"]) < args.min_agreement
+        ]
+        if failing:
+            print(f"Below {args.min_agreement} agreement: {', '.join(failing)}")
+            failed = True
+    if failed:
+        sys.exit(1)
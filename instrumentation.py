@@ -0,0 +1,201 @@
+# instrumentation.py
+import atexit
+import functools
+import os
+import threading
+import time
+
+###############################################################################
+# Stage Timing (per-process counters)
+###############################################################################
+# Wrap a stage either way:
+#
+#   with timed("tfidf_transform"):
+#       ...
+#
+#   @timed("gcs_upload")
+#   def upload_to_gcs(...): ...
+#
+# Every stage keeps a call count, error count, total and max seconds,
+# aggregated over all sessions and threads in the process. Export them with
+# log_line() or prometheus_text(), or let TimingReporter do it periodically.
+#
+# Enable with DISC_TIMING=1. When disabled, `timed` returns a shared no-op:
+# decorators hand back the undecorated function and `with` blocks cost one
+# attribute lookup and two empty method calls.
+###############################################################################
+TIMING_ENABLED = os.environ.get("DISC_TIMING", "0") == "1"
+# Seconds between reports from TimingReporter; 0 disables it
+TIMING_REPORT_INTERVAL_S = float(os.environ.get("DISC_TIMING_REPORT_INTERVAL_S", "60"))
+# If set, TimingReporter also writes Prometheus text for the node_exporter
+# textfile collector. Each process writes its own <value>.<pid>.prom, so
+# workers never overwrite each other's counters.
+TIMING_PROM_FILE = os.environ.get("DISC_TIMING_PROM_FILE")
+
+class StageStats:
+    __slots__ = ("count", "errors", "total_s", "max_s")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def record(stage: str, seconds: float, error: bool = False):
+    with _stats_lock:
+        stats = _stats.get(stage)
+        if stats is None:
+            stats = _stats[stage] = StageStats()
+        stats.count += 1
+        stats.errors += error
+        stats.total_s += seconds
+        if seconds > stats.max_s:
+            stats.max_s = seconds
+
+class _StageTimer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                record(stage, time.perf_counter() - start, error)
+        return wrapper
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __call__(self, fn):
+        return fn
+
+_NOOP_TIMER = _NoopTimer()
+
+def timed(stage: str):
+    """Context manager / decorator that adds one call of `stage` to the counters."""
+    return _StageTimer(stage) if TIMING_ENABLED else _NOOP_TIMER
+
+###############################################################################
+# Export
+###############################################################################
+def snapshot() -> dict:
+    """{stage: {"count", "errors", "total_s", "mean_ms", "max_ms"}} for this process."""
+    with _stats_lock:
+        items = [(stage, s.count, s.errors, s.total_s, s.max_s) for stage, s in _stats.items()]
+    return {
+        stage: {
+            "count": count,
+            "errors": errors,
+            "total_s": total_s,
+            "mean_ms": 1000 * total_s / count if count else 0.0,
+            "max_ms": 1000 * max_s,
+        }
+        for stage, count, errors, total_s, max_s in sorted(items)
+    }
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+def log_line() -> str:
+    """One line, e.g. 'timing score_answer n=12 mean=41.2ms max=88.0ms err=0 | ...'."""
+    parts = [
+        f"{stage} n={s['count']} mean={s['mean_ms']:.1f}ms max={s['max_ms']:.1f}ms err={s['errors']}"
+        for stage, s in snapshot().items()
+    ]
+    return "timing " + " | ".join(parts) if parts else "timing (no samples)"
+
+def prometheus_text(prefix: str = "disc_stage") -> str:
+    """Counters in the Prometheus text exposition format, labelled by stage and pid."""
+    pid = os.getpid()
+    lines = [
+        f"# HELP {prefix}_calls_total Calls per pipeline stage.",
+        f"# TYPE {prefix}_calls_total counter",
+        f"# HELP {prefix}_errors_total Calls per pipeline stage that raised.",
+        f"# TYPE {prefix}_errors_total counter",
+        f"# HELP {prefix}_seconds_total Wall time spent per pipeline stage.",
+        f"# TYPE {prefix}_seconds_total counter",
+        f"# HELP {prefix}_max_seconds Slowest single call per pipeline stage.",
+        f"# TYPE {prefix}_max_seconds gauge",
+    ]
+    for stage, s in snapshot().items():
+        labels = f'{{stage="{stage}",pid="{pid}"}}'
+        lines.append(f"{prefix}_calls_total{labels} {s['count']}")
+        lines.append(f"{prefix}_errors_total{labels} {s['errors']}")
+        lines.append(f"{prefix}_seconds_total{labels} {s['total_s']:.6f}")
+        lines.append(f"{prefix}_max_seconds{labels} {s['max_ms'] / 1000:.6f}")
+    return "\n".join(lines) + "\n"
+
+def prometheus_file_for(prefix: str, pid: int = None) -> str:
+    return f"{prefix}.{os.getpid() if pid is None else pid}.prom"
+
+def write_prometheus_file(path: str):
+    # Write then rename so a scraper never reads a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class TimingReporter(threading.Thread):
+    """Daemon thread that prints log_line() and refreshes the Prometheus file."""
+    def __init__(self, interval_s: float, prom_file: str = None):
+        super().__init__(name="disc-timing-reporter", daemon=True)
+        self.interval_s = interval_s
+        # prom_file is a prefix; this process writes <prefix>.<pid>.prom
+        self.prom_file = prometheus_file_for(prom_file) if prom_file else None
+        self.stop_event = threading.Event()
+        if self.prom_file:
+            # Stop exporting a dead worker's series on a clean exit
+            atexit.register(_remove_file, self.prom_file)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_s):
+            try:
+                print(log_line())
+                if self.prom_file:
+                    write_prometheus_file(self.prom_file)
+            except Exception as e:
+                print(f"Timing report failed: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+def start_timing_reporter(interval_s: float = TIMING_REPORT_INTERVAL_S, prom_file: str = TIMING_PROM_FILE):
+    if not TIMING_ENABLED or interval_s <= 0:
+        return None
+    reporter = TimingReporter(interval_s, prom_file)
+    reporter.start()
+    return reporter
@@ -0,0 +1,124 @@
+# profiling.py
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+###############################################################################
+# Per-rerun Profiling (opt-in)
+###############################################################################
+# With DISC_PROFILE=1 every Streamlit rerun of main() runs under cProfile
+# and its stats are written to DISC_PROFILE_DIR as
+#   <unix-ms>-<pid>-<page>.prof
+# Only the newest DISC_PROFILE_KEEP files are kept.
+#
+# It is safe to enable on one production worker:
+#   - only one rerun per process is profiled at a time (cProfile is
+#     process-wide on recent Pythons); concurrent reruns just run unprofiled
+#   - DISC_PROFILE_SAMPLE_RATE (0..1) profiles only a fraction of reruns
+#
+# Aggregated report over the captured files (optionally for one page):
+#   python profiling.py --page disc_result --top 30
+###############################################################################
+PROFILE_ENABLED = os.environ.get("DISC_PROFILE", "0") == "1"
+PROFILE_DIR = os.environ.get("DISC_PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("DISC_PROFILE_KEEP", "200"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("DISC_PROFILE_SAMPLE_RATE", "1.0"))
+
+_profile_lock = threading.Lock()
+
+def _safe_tag(tag: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(tag))[:64] or "unknown"
+
+def _rotate_profiles(profile_dir: str, keep: int):
+    files = sorted(name for name in os.listdir(profile_dir) if name.endswith(".prof"))
+    for name in files[:-keep] if keep > 0 else files:
+        try:
+            os.remove(os.path.join(profile_dir, name))
+        except OSError:
+            pass
+
+@contextmanager
+def profile_rerun(tag: str):
+    """Profile the enclosed block (one rerun) and save it tagged with `tag`."""
+    if not PROFILE_ENABLED or random.random() >= PROFILE_SAMPLE_RATE:
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) is already active
+            print(f"Profiling skipped: {e}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                name = f"{int(time.time() * 1000)}-{os.getpid()}-{_safe_tag(tag)}.prof"
+                profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+                _rotate_profiles(PROFILE_DIR, PROFILE_KEEP)
+            except Exception as e:
+                print(f"Could not save profile for {tag}: {e}")
+    finally:
+        _profile_lock.release()
+
+###############################################################################
+# Aggregated report
+###############################################################################
+def profile_files(profile_dir: str = PROFILE_DIR, page: str = None) -> list:
+    if not os.path.isdir(profile_dir):
+        return []
+    files = sorted(name for name in os.listdir(profile_dir) if name.endswith(".prof"))
+    if page is not None:
+        files = [name for name in files if name[:-len(".prof")].split("-", 2)[-1] == _safe_tag(page)]
+    return [os.path.join(profile_dir, name) for name in files]
+
+def profile_report(profile_dir: str = PROFILE_DIR, page: str = None, top: int = 30,
+                   sort_by: str = "cumulative") -> str:
+    """Per-page capture counts plus the top-N functions over all matching captures."""
+    files = profile_files(profile_dir, page)
+    if not files:
+        return f"No profiles in {profile_dir}" + (f" for page {page}" if page else "")
+
+    per_page = {}
+    for path in files:
+        tag = os.path.basename(path)[:-len(".prof")].split("-", 2)[-1]
+        stats = pstats.Stats(path)
+        count, total = per_page.get(tag, (0, 0.0))
+        per_page[tag] = (count + 1, total + stats.total_tt)
+
+    out = io.StringIO()
+    out.write(f"{'page':<36}{'reruns':>8}{'total s':>10}{'mean ms':>10}\n")
+    for tag, (count, total) in sorted(per_page.items(), key=lambda item: -item[1][1]):
+        out.write(f"{tag:<36}{count:>8}{total:>10.2f}{1000 * total / count:>10.1f}\n")
+    out.write("\n")
+
+    stats = pstats.Stats(files[0], stream=out)
+    for path in files[1:]:
+        stats.add(path)
+    stats.strip_dirs().sort_stats(sort_by).print_stats(top)
+    return out.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate per-rerun profiles written with DISC_PROFILE=1.")
+    parser.add_argument("--dir", default=PROFILE_DIR)
+    parser.add_argument("--page", default=None, help="only reruns tagged with this page")
+    parser.add_argument("--top", type=int, default=30)
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key, e.g. cumulative or tottime")
+    args = parser.parse_args()
+    print(profile_report(args.dir, args.page, args.top, args.sort))
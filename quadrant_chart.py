@@ -0,0 +1,132 @@
+# quadrant_chart.py
+import io
+import os
+from functools import lru_cache
+
+###############################################################################
+# DiSC Quadrant Chart
+###############################################################################
+# The chart is a static background (four tinted quadrants, axes and the big
+# D / I / C / S letters) plus an overlay of four score points joined as a
+# polygon:
+#   D => (-pct_D, +pct_D)  top-left        I => (+pct_I, +pct_I)  top-right
+#   C => (-pct_C, -pct_C)  bottom-left     S => (+pct_S, -pct_S)  bottom-right
+#
+# The background is built once per process; each chart only adds the overlay.
+#   "svg"         (default) a few hundred bytes of SVG markup, drawn by the browser
+#   "matplotlib"  PNG bytes; the background is rasterised once and matplotlib is
+#                 imported only when this backend is used. Figures are closed.
+###############################################################################
+CHART_BACKEND = os.environ.get("DISC_CHART_BACKEND", "svg")
+CHART_BACKENDS = ("svg", "matplotlib")
+
+# Quadrant order: (label, x0, y0, colour) in data coordinates (-100..100)
+QUADRANTS = (
+    ("D", -100, 0, "#A8D5A2"),    # top-left, green
+    ("I", 0, 0, "#F4A8A8"),       # top-right, red
+    ("C", -100, -100, "#FAF3AD"), # bottom-left, yellow
+    ("S", 0, -100, "#A8D7F4"),    # bottom-right, blue
+)
+
+def quadrant_points(percentages: dict) -> list:
+    """(x, y) of D, I, S, C in polygon order (D -> I -> S -> C)."""
+    return [
+        (-percentages["D"], +percentages["D"]),
+        (+percentages["I"], +percentages["I"]),
+        (+percentages["S"], -percentages["S"]),
+        (-percentages["C"], -percentages["C"]),
+    ]
+
+###############################################################################
+# SVG
+###############################################################################
+SVG_SIZE = 400  # viewBox units; the chart scales to its container
+
+def _svg_xy(x: float, y: float) -> tuple:
+    scale = SVG_SIZE / 200
+    return (x + 100) * scale, (100 - y) * scale
+
+@lru_cache(maxsize=1)
+def _svg_background() -> str:
+    half = SVG_SIZE / 2
+    parts = []
+    for label, x0, y0, colour in QUADRANTS:
+        left, top = _svg_xy(x0, y0 + 100)
+        parts.append(f'<rect x="{left:g}" y="{top:g}" width="{half:g}" height="{half:g}" fill="{colour}" fill-opacity="0.3"/>')
+    for label, x0, y0, _ in QUADRANTS:
+        cx, cy = _svg_xy(x0 + 50, y0 + 50)
+        parts.append(
+            f'<text x="{cx:g}" y="{cy:g}" font-size="{SVG_SIZE * 0.45:g}" fill="gray" fill-opacity="0.2" '
+            f'text-anchor="middle" dominant-baseline="central" font-family="sans-serif">{label}</text>'
+        )
+    parts.append(f'<line x1="0" y1="{half:g}" x2="{SVG_SIZE}" y2="{half:g}" stroke="black" stroke-width="1"/>')
+    parts.append(f'<line x1="{half:g}" y1="0" x2="{half:g}" y2="{SVG_SIZE}" stroke="black" stroke-width="1"/>')
+    parts.append(f'<rect x="0.5" y="0.5" width="{SVG_SIZE - 1}" height="{SVG_SIZE - 1}" fill="none" stroke="black"/>')
+    return "".join(parts)
+
+def quadrant_chart_svg(percentages: dict) -> str:
+    points = [_svg_xy(x, y) for x, y in quadrant_points(percentages)]
+    polygon = " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+    dots = "".join(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="4" fill="black"/>' for x, y in points)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {SVG_SIZE} {SVG_SIZE}" '
+        f'width="100%" style="max-width:{SVG_SIZE}px">'
+        f'{_svg_background()}<polygon points="{polygon}" fill="none" stroke="black" stroke-width="1"/>{dots}</svg>'
+    )
+
+###############################################################################
+# Matplotlib (PNG)
+###############################################################################
+@lru_cache(maxsize=1)
+def _matplotlib_background():
+    """The static quadrant layer rasterised once, as an RGBA array."""
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    import numpy as np
+
+    fig = plt.figure(figsize=(4, 4), dpi=100)
+    ax = fig.add_axes([0, 0, 1, 1])
+    for label, x0, y0, colour in QUADRANTS:
+        ax.add_patch(patches.Rectangle((x0, y0), 100, 100, facecolor=colour, alpha=0.3))
+        ax.text(x0 + 50, y0 + 50, label, fontsize=100, color="gray", alpha=0.2, ha="center", va="center")
+    ax.axhline(0, color="black", linewidth=1)
+    ax.axvline(0, color="black", linewidth=1)
+    ax.set_xlim([-100, 100])
+    ax.set_ylim([-100, 100])
+    ax.axis("off")
+    fig.canvas.draw()
+    background = np.asarray(fig.canvas.buffer_rgba()).copy()
+    plt.close(fig)
+    background.setflags(write=False)
+    return background
+
+def quadrant_chart_png(percentages: dict) -> bytes:
+    background = _matplotlib_background()
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(4, 4))
+    try:
+        ax.imshow(background, extent=[-100, 100, -100, 100], interpolation="nearest")
+        points = quadrant_points(percentages)
+        xs = [x for x, _ in points] + [points[0][0]]
+        ys = [y for _, y in points] + [points[0][1]]
+        ax.plot(xs[:-1], ys[:-1], "ko", markersize=6)
+        ax.plot(xs, ys, color="black", linewidth=1)
+        ax.set_xlim([-100, 100])
+        ax.set_ylim([-100, 100])
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_aspect("equal")
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+def render_quadrant_chart(percentages: dict, backend: str = CHART_BACKEND) -> dict:
+    """{"format": "svg", "data": str} or {"format": "png", "data": bytes}."""
+    if backend == "svg":
+        return {"format": "svg", "data": quadrant_chart_svg(percentages)}
+    if backend == "matplotlib":
+        return {"format": "png", "data": quadrant_chart_png(percentages)}
+    raise ValueError(f"Unknown chart backend {backend!r}; expected one of {CHART_BACKENDS}")
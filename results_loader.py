@@ -0,0 +1,240 @@
+# results_loader.py
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+###############################################################################
+# Incremental, parallel loading of candidate result CSVs
+###############################################################################
+# An IncrementalCSVLoader keeps every CSV under gs://<bucket>/<prefix> in a
+# local cache, plus a manifest of blob name -> generation:
+#
+#   <cache>/<bucket>/<prefix>/manifest.json
+#   <cache>/<bucket>/<prefix>/blobs/<sha1 of blob name>.csv
+#
+# load() lists the prefix (names and generations only), downloads just the
+# new or changed blobs on a thread pool, drops deleted ones and returns the
+# merged DataFrame in blob-name order, like the original sequential merge.
+# One loader is shared by every HR session in the process, and listings are
+# reused for refresh_s seconds so reruns do not hit GCS at all.
+#
+# If compact_results.py has folded the prefix into a Parquet snapshot, the
+# snapshot parts are read in bulk and only blobs missing from it (or changed
+# since) are fetched one by one.
+###############################################################################
+RESULTS_CACHE_DIR = os.environ.get("DISC_RESULTS_CACHE_DIR", "results_cache")
+RESULTS_WORKERS = int(os.environ.get("DISC_RESULTS_WORKERS", "16"))
+# Seconds a listing stays fresh; 0 lists on every load
+RESULTS_REFRESH_S = float(os.environ.get("DISC_RESULTS_REFRESH_S", "30"))
+
+# Snapshots of <prefix> live under <SNAPSHOT_ROOT><prefix>
+SNAPSHOT_ROOT = os.environ.get("DISC_RESULTS_SNAPSHOT_ROOT", "compacted/")
+SNAPSHOT_FORMAT_VERSION = 1
+# Column in snapshot parts naming the blob each row came from
+SOURCE_COLUMN = "_source_blob"
+
+def snapshot_prefix_for(prefix: str) -> str:
+    return SNAPSHOT_ROOT + prefix
+
+def snapshot_manifest_path(prefix: str) -> str:
+    return snapshot_prefix_for(prefix) + "manifest.json"
+
+def read_snapshot_manifest(client, bucket_name: str, prefix: str):
+    """(manifest dict, GCS generation), or (None, None) if the prefix was never compacted."""
+    blob = client.bucket(bucket_name).get_blob(snapshot_manifest_path(prefix))
+    if blob is None:
+        return None, None
+    manifest = json.loads(blob.download_as_bytes())
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot manifest version: {manifest.get('format_version')}")
+    return manifest, int(blob.generation)
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name).strip("_") or "root"
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class IncrementalCSVLoader:
+    def __init__(self, client, bucket_name: str, prefix: str, cache_dir: str = RESULTS_CACHE_DIR,
+                 workers: int = RESULTS_WORKERS, refresh_s: float = RESULTS_REFRESH_S):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.workers = workers
+        self.refresh_s = refresh_s
+        self.cache_dir = os.path.join(cache_dir, _safe_name(bucket_name), _safe_name(prefix))
+        self.blob_dir = os.path.join(self.cache_dir, "blobs")
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()   # blob name -> generation
+        self._frames = {}                        # blob name -> (generation, DataFrame)
+        self._merged = None
+        self._listed_at = 0.0
+        self._snapshot_generation = None
+        self._snapshot_sources = {}              # blob name -> generation folded into the snapshot
+        self._snapshot_frame = None
+        self._merged_snapshot_names = set()
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return {name: int(generation) for name, generation in json.load(f)["blobs"].items()}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _write_manifest(self):
+        data = {"bucket": self.bucket_name, "prefix": self.prefix, "updated_at": time.time(), "blobs": self._manifest}
+        _write_atomic(self.manifest_path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _local_path(self, blob_name: str) -> str:
+        return os.path.join(self.blob_dir, hashlib.sha1(blob_name.encode("utf-8")).hexdigest() + ".csv")
+
+    def list_blobs(self) -> dict:
+        """{blob name: generation} for every CSV under the prefix."""
+        blobs = self.client.list_blobs(self.bucket_name, prefix=self.prefix,
+                                       fields="items(name,generation),nextPageToken")
+        return {blob.name: int(blob.generation) for blob in blobs if blob.name.endswith(".csv")}
+
+    def _download(self, blob_name: str, generation: int) -> bytes:
+        bucket = self.client.bucket(self.bucket_name)
+        data = bucket.blob(blob_name, generation=generation).download_as_bytes()
+        _write_atomic(self._local_path(blob_name), data)
+        return data
+
+    def _frame_from_cache(self, blob_name: str):
+        try:
+            return pd.read_csv(self._local_path(blob_name))
+        except (OSError, ValueError):
+            return None
+
+    def _download_part(self, path: str) -> pd.DataFrame:
+        # Part files are immutable (unique names), so a cached copy never goes stale
+        local_path = os.path.join(self.cache_dir, "snapshot", hashlib.sha1(path.encode("utf-8")).hexdigest() + ".parquet")
+        if not os.path.exists(local_path):
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            _write_atomic(local_path, self.client.bucket(self.bucket_name).blob(path).download_as_bytes())
+        return pd.read_parquet(local_path)
+
+    def _refresh_snapshot(self):
+        """Reload the snapshot when its manifest changed; on any error carry on without one."""
+        try:
+            manifest, generation = read_snapshot_manifest(self.client, self.bucket_name, self.prefix)
+            if generation == self._snapshot_generation:
+                return
+            if manifest is None:
+                sources, frame = {}, None
+            else:
+                paths = [partition["path"] for _, partition in sorted(manifest["partitions"].items())]
+                with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(paths) or 1))) as pool:
+                    parts = list(pool.map(self._download_part, paths))
+                sources = {name: int(source["generation"]) for name, source in manifest["sources"].items()}
+                frame = pd.concat(parts, ignore_index=True) if parts else None
+                print(f"Loaded results snapshot of {len(sources)} file(s) in {len(paths)} part(s) "
+                      f"for gs://{self.bucket_name}/{self.prefix}.")
+        except Exception as e:
+            print(f"Could not load results snapshot for {self.prefix}; reading files individually: {e}")
+            generation, sources, frame = None, {}, None
+        self._snapshot_generation = generation
+        self._snapshot_sources = sources
+        self._snapshot_frame = frame
+        # Force the merge to be rebuilt
+        self._merged = None
+
+    def load(self, force: bool = False) -> pd.DataFrame:
+        """All CSVs under the prefix merged into one DataFrame (a copy the caller may modify)."""
+        with self._lock:
+            if force or self._merged is None or time.monotonic() - self._listed_at >= self.refresh_s:
+                self._refresh()
+            return self._merged.copy()
+
+    def _refresh(self):
+        self._refresh_snapshot()
+        listed = self.list_blobs()
+        self._listed_at = time.monotonic()
+
+        # Blobs already in the snapshot at the listed generation are not fetched
+        # (a snapshot without any rows covers nothing, whatever its manifest says)
+        in_snapshot = set()
+        if self._snapshot_frame is not None:
+            in_snapshot = {name for name, generation in listed.items() if self._snapshot_sources.get(name) == generation}
+        for name in in_snapshot:
+            if name in self._frames:
+                self._frames.pop(name)
+                self._manifest.pop(name, None)
+                try:
+                    os.remove(self._local_path(name))
+                except OSError:
+                    pass
+        listed = {name: generation for name, generation in listed.items() if name not in in_snapshot}
+
+        # Drop blobs that disappeared from the bucket
+        removed = [name for name in self._manifest if name not in listed]
+        for name in removed:
+            self._manifest.pop(name, None)
+            self._frames.pop(name, None)
+            try:
+                os.remove(self._local_path(name))
+            except OSError:
+                pass
+
+        # Parse what is already cached locally at the listed generation
+        changed = bool(removed)
+        to_download = []
+        for name, generation in listed.items():
+            cached = self._frames.get(name)
+            if cached is not None and cached[0] == generation:
+                continue
+            if self._manifest.get(name) == generation:
+                frame = self._frame_from_cache(name)
+                if frame is not None:
+                    self._frames[name] = (generation, frame)
+                    changed = True
+                    continue
+            to_download.append((name, generation))
+
+        if to_download:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(to_download)))) as pool:
+                futures = {pool.submit(self._download, name, generation): (name, generation)
+                           for name, generation in to_download}
+                for future, (name, generation) in futures.items():
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        # Keep the previous version (if any) and try again on the next refresh
+                        print(f"Could not download gs://{self.bucket_name}/{name}: {e}")
+                        continue
+                    self._frames[name] = (generation, pd.read_csv(io.BytesIO(data)))
+                    self._manifest[name] = generation
+                    changed = True
+            print(f"Loaded {len(to_download)} new or changed result file(s) from gs://{self.bucket_name}/{self.prefix}.")
+
+        if changed or self._merged is None or in_snapshot != self._merged_snapshot_names:
+            self._write_manifest()
+            self._merged = self._merge(in_snapshot)
+            self._merged_snapshot_names = in_snapshot
+
+    def _merge(self, in_snapshot: set) -> pd.DataFrame:
+        """Snapshot rows of still-listed blobs plus the individual files, in blob-name order."""
+        if not in_snapshot:
+            frames = [self._frames[name][1] for name in sorted(self._frames)]
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        snapshot = self._snapshot_frame
+        frames = [] if snapshot is None else [snapshot[snapshot[SOURCE_COLUMN].isin(in_snapshot)]]
+        frames += [self._frames[name][1].assign(**{SOURCE_COLUMN: name}) for name in sorted(self._frames)]
+        if not frames:
+            return pd.DataFrame()
+        merged = pd.concat(frames, ignore_index=True)
+        merged = merged.sort_values(SOURCE_COLUMN, kind="stable").drop(columns=SOURCE_COLUMN)
+        return merged.reset_index(drop=True)
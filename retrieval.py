@@ -1,29 +1,48 @@
 # retrieval.py
+import base64
+import os
 import pickle
+import shutil
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from sklearn.feature_extraction.text import TfidfVectorizer
 from google.cloud import storage
 import streamlit as st
 import json
 from google.oauth2 import service_account
+from chunk_store import ColumnarChunks, convert_chunks_pickle, is_store_current, store_dir_for
+from embedding_backends import MODEL_NAME, load_embedding_backend, with_micro_batching
+from embedding_server import RemoteEmbeddingBackend
+from instrumentation import timed
+from vector_index import (
+    IVFIndex, dequantise_rows, dot_rows, exact_search, hybrid_method_of, normalise_rows, top_n_indices,
+)
 
 ###############################################################################
 #  GCS Configuration
 ###############################################################################
 # ตั้งค่าตัวแปร GOOGLE_APPLICATION_CREDENTIALS
 
-# Read your service account JSON from secrets
-service_account_json = st.secrets["general"]["GOOGLE_APPLICATION_CREDENTIALS_JSON"]
+# Set to a folder written by build_index.py to load artifacts from disk and
+# skip GCS entirely (offline benchmarks, local development)
+LOCAL_ARTIFACTS_DIR = os.environ.get("DISC_LOCAL_ARTIFACTS_DIR")
 
-# Parse the string into a Python dict
-service_account_info = json.loads(service_account_json)
+def create_gcs_client():
+    # Read your service account JSON from secrets
+    service_account_json = st.secrets["general"]["GOOGLE_APPLICATION_CREDENTIALS_JSON"]
 
-# Create credentials object
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
+    # Parse the string into a Python dict
+    service_account_info = json.loads(service_account_json)
 
-# Then initialize your Cloud Storage client with these credentials
-client = storage.Client(credentials=credentials, project=service_account_info["project_id"])
+    # Create credentials object
+    credentials = service_account.Credentials.from_service_account_info(service_account_info)
+
+    # Then initialize your Cloud Storage client with these credentials
+    return storage.Client(credentials=credentials, project=service_account_info["project_id"])
+
+client = None if LOCAL_ARTIFACTS_DIR else create_gcs_client()
 
 # ฟังก์ชันสำหรับดาวน์โหลดไฟล์จาก GCS
 def download_from_gcs(bucket_name, source_blob_name, destination_file_name):
@@ -33,39 +52,152 @@ def download_from_gcs(bucket_name, source_blob_name, destination_file_name):
     print(f"Downloaded {source_blob_name} to {destination_file_name}.")
 
 
+###############################################################################
+#  Local Artifact Cache (content-addressed by blob generation + MD5)
+###############################################################################
+ARTIFACT_CACHE_DIR = os.environ.get("DISC_ARTIFACT_CACHE_DIR", "artifact_cache")
+
+def _write_json_atomic(path: str, data: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _prune_artifact_versions(cache_dir: str, keep_key: str):
+    """Remove older versions (and files derived from them) of one artifact."""
+    for name in os.listdir(cache_dir):
+        if name == "current.json" or name.startswith(keep_key) or name.endswith(".tmp"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            print(f"Could not remove old artifact {path}: {e}")
+
+def _artifact_cache_dir(source_blob_name: str) -> str:
+    return os.path.join(ARTIFACT_CACHE_DIR, source_blob_name.replace("/", "__"))
+
+def commit_artifact(source_blob_name: str, local_path: str):
+    """
+    Record local_path as the version in use and remove older ones. Called only
+    once artifacts built from it have been published, so a version that fails
+    to load never becomes the offline fallback or deletes the one in use.
+    """
+    cache_dir = _artifact_cache_dir(source_blob_name)
+    key = os.path.splitext(os.path.basename(local_path))[0]
+    _write_json_atomic(os.path.join(cache_dir, "current.json"), {"key": key, "path": local_path})
+    _prune_artifact_versions(cache_dir, key)
+
+@timed("artifact_fetch")
+def fetch_artifact(bucket_name: str, source_blob_name: str) -> str:
+    """
+    Returns a local path to the current version of a GCS blob.
+
+    Each version is stored as <cache>/<blob>/<generation>-<md5><ext>, so an
+    unchanged blob costs one metadata request and no download. New versions are
+    downloaded to a temp file and atomically renamed into place. If GCS cannot
+    be reached, the last version passed to commit_artifact is returned.
+    """
+    cache_dir = _artifact_cache_dir(source_blob_name)
+    pointer_path = os.path.join(cache_dir, "current.json")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    try:
+        blob = client.bucket(bucket_name).get_blob(source_blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"gs://{bucket_name}/{source_blob_name} does not exist")
+        md5_hex = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else "nomd5"
+        key = f"{blob.generation}-{md5_hex}"
+        local_path = os.path.join(cache_dir, key + os.path.splitext(source_blob_name)[1])
+
+        if os.path.exists(local_path):
+            print(f"Using cached {source_blob_name} (generation {blob.generation}).")
+        else:
+            tmp_path = f"{local_path}.{os.getpid()}.tmp"
+            try:
+                blob.download_to_filename(tmp_path, if_generation_match=blob.generation)
+                os.replace(tmp_path, local_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            print(f"Downloaded {source_blob_name} to {local_path}.")
+        return local_path
+    except Exception as e:
+        if os.path.exists(pointer_path):
+            with open(pointer_path, "r", encoding="utf-8") as f:
+                cached_path = json.load(f)["path"]
+            if os.path.exists(cached_path):
+                print(f"Could not refresh {source_blob_name} ({e}); using cached {cached_path}.")
+                return cached_path
+        raise
+
+
 ###############################################################################
 #  Load embeddings from GCS
 ###############################################################################
 bucket_name = "streamlit-disc-candidate-bucket"
 
 # ระบุไฟล์ embeddings ที่จะดาวน์โหลดจาก GCS
-vectorizer_path = "local_disc_tfidf_vectorizer.pkl"
-chunks_path = "local_disc_tfidf_chunks.pkl"
-
-download_from_gcs(bucket_name, "embeddings/disc_tfidf_vectorizer.pkl", vectorizer_path)
-download_from_gcs(bucket_name, "embeddings/disc_tfidf_chunks.pkl", chunks_path)
+if LOCAL_ARTIFACTS_DIR:
+    vectorizer_path = os.path.join(LOCAL_ARTIFACTS_DIR, "disc_tfidf_vectorizer.pkl")
+    chunks_path = os.path.join(LOCAL_ARTIFACTS_DIR, "disc_tfidf_chunks.pkl")
+else:
+    vectorizer_path = fetch_artifact(bucket_name, "embeddings/disc_tfidf_vectorizer.pkl")
+    chunks_path = fetch_artifact(bucket_name, "embeddings/disc_tfidf_chunks.pkl")
+# Storage precision of chunk vectors: "float32" (default), "float16" or "int8"
+VECTOR_DTYPE = os.environ.get("DISC_VECTOR_DTYPE", "float32")
 
 ###############################################################################
 #  Optimized Loading for Vectorizer and Chunks
 ###############################################################################
-@st.cache_resource
-def load_model():
-    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# "torch" (default), "onnx" or "onnx-int8"; see embedding_backends.py
+EMBEDDING_BACKEND = os.environ.get("DISC_EMBEDDING_BACKEND", "torch")
+
+# Address of a shared embedding_server.py (socket path or host:port); unset
+# loads the model in this process
+EMBEDDING_SERVER = os.environ.get("DISC_EMBEDDING_SERVER")
+# Exported / quantised ONNX models are cached here
+ONNX_MODEL_DIR = os.path.join(ARTIFACT_CACHE_DIR, "onnx", MODEL_NAME.replace("/", "__"))
 
 @st.cache_resource
+@timed("model_load")
+def load_model(backend: str = EMBEDDING_BACKEND, server: str = EMBEDDING_SERVER):
+    if server:
+        try:
+            return RemoteEmbeddingBackend(server, fallback=lambda: load_local_model(backend))
+        except (ConnectionError, OSError, RuntimeError) as e:
+            print(f"Embedding server {server} unavailable ({e}); loading the model in-process.")
+    return load_local_model(backend)
+
+def load_local_model(backend: str = EMBEDDING_BACKEND):
+    """The embedding backend in this process, behind a micro-batching queue shared by all sessions."""
+    try:
+        return with_micro_batching(load_embedding_backend(backend, MODEL_NAME, ONNX_MODEL_DIR))
+    except Exception as e:
+        if backend == "torch":
+            raise
+        print(f"Could not load embedding backend {backend!r} ({e}); falling back to torch.")
+        return with_micro_batching(load_embedding_backend("torch", MODEL_NAME))
+
+# The loaders below are plain functions so the hot-reload watcher can build
+# a new artifact version without it being pinned in the Streamlit cache.
 def load_vectorizer(path: str):
     with open(path, "rb") as f:
         return pickle.load(f)
 
-@st.cache_resource
-def load_chunks(path: str):
-    with open(path, "rb") as f:
-        return pickle.load(f)
+def store_path_for(pickle_path: str, vector_dtype: str = VECTOR_DTYPE) -> str:
+    return store_dir_for(pickle_path, vector_dtype)
+
+def load_chunk_store(pickle_path: str, store_path: str, vector_dtype: str = VECTOR_DTYPE):
+    """Memory-map the columnar chunk store, converting from the pickle if it is newer."""
+    if not is_store_current(pickle_path, store_path):
+        convert_chunks_pickle(pickle_path, store_path, vector_dtype)
+    return ColumnarChunks(store_path)
 
 model = load_model()
-vectorizer = load_vectorizer(vectorizer_path)
-chunks = load_chunks(chunks_path)
-vocab = vectorizer.vocabulary_
 
 ###############################################################################
 # Negation Words & Switch Logic
@@ -103,31 +235,189 @@ def switch_type_set_2(original_type: str) -> str:
         return "S"
     return original_type
 
+def negation_switched_type(question_id: str, original_type: str) -> str:
+    """The type shown for a negated answer's best match."""
+    if question_id in ["Q1", "Q2", "Q5"]:
+        return switch_type_set_1(original_type)
+    elif question_id in ["Q3", "Q4", "Q6"]:
+        return switch_type_set_2(original_type)
+    return original_type
+
 ###############################################################################
 # Building Hybrid Vectors for new user answer
 ###############################################################################
 def preprocess_text_for_retrieval(text: str) -> str:
-    """Optionally replicate the same cleanup you did in utils.py"""
+    """Must match the cleanup in build_index.preprocess_text"""
     return text.lower()  # minimal for now—adjust as needed
 
+###############################################################################
+# Token Embedding Cache (shared by every session in this process)
+###############################################################################
+TOKEN_CACHE_SIZE = 50_000
+
+class TokenEmbeddingCache:
+    """
+    Bounded LRU cache of token -> embedding.
+    All tokens missing from the cache are encoded in a single batched call.
+    """
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, tokens, encode_fn) -> dict:
+        """Return {token: embedding} for the unique tokens given."""
+        found = {}
+        missing = []
+        with self._lock:
+            for token in tokens:
+                emb = self._data.get(token)
+                if emb is None:
+                    missing.append(token)
+                else:
+                    self._data.move_to_end(token)
+                    found[token] = emb
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            embs = encode_fn(missing)
+            with self._lock:
+                for token, emb in zip(missing, embs):
+                    self._data[token] = emb
+                    self._data.move_to_end(token)
+                    found[token] = emb
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+@st.cache_resource
+def load_token_cache():
+    return TokenEmbeddingCache()
+
+token_cache = load_token_cache()
+
+@timed("token_encode")
+def encode_tokens(tokens):
+    """Encode a list of tokens with one batched model call."""
+    return model.encode(list(tokens), convert_to_numpy=True)
+
 def get_token_embedding(token):
-    return model.encode(token)
+    return token_cache.get_many([token], encode_tokens)[token]
+
+###############################################################################
+# Vocabulary Embedding Matrix (one row per TF-IDF vocabulary index)
+###############################################################################
+# "1" always uses the matrix, "0" always encodes per token at request time.
+# "auto" (default) follows the method recorded on the vectorizer: build_index.py
+# marks its output "matmul"; the legacy GCS pickle carries no mark and was built
+# per token, so switch it on there only once golden_eval.py shows agreement.
+USE_VOCAB_MATRIX = os.environ.get("DISC_USE_VOCAB_MATRIX", "auto")
+
+def vocab_matrix_enabled(vectorizer) -> bool:
+    if USE_VOCAB_MATRIX == "auto":
+        return hybrid_method_of(vectorizer) == "matmul"
+    return USE_VOCAB_MATRIX == "1"
+
+def vocab_matrix_path_for(vectorizer_path: str) -> str:
+    """
+    The matrix lives next to the cached vectorizer and is keyed by backend, so
+    a new vectorizer version or a different embedding backend gets its own file.
+    """
+    return f"{os.path.splitext(vectorizer_path)[0]}_vocab_matrix_{model.name}.npy"
+
+@timed("vocab_matrix_build")
+def build_vocab_matrix(path: str, vocab: dict, batch_size: int = 256):
+    """
+    Encode every vocabulary term once and save a (len(vocab), dim) float32
+    matrix whose row i is the embedding of the term with vocabulary index i.
+    """
+    terms = [None] * len(vocab)
+    for term, index in vocab.items():
+        terms[index] = term
+    matrix = model.encode(terms, batch_size=batch_size, convert_to_numpy=True)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    # Other workers may be loading the same path: write a temp file and rename
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"Built vocabulary matrix {matrix.shape} at {path}.")
+    return matrix
+
+def load_vocab_matrix(path: str, vocab: dict):
+    """Memory-map the vocabulary matrix, rebuilding it if missing or stale."""
+    expected_shape = (len(vocab), model.get_sentence_embedding_dimension())
+    if os.path.exists(path):
+        matrix = np.load(path, mmap_mode="r")
+        if matrix.shape == expected_shape and matrix.dtype == np.float32:
+            return matrix
+        print(f"Vocabulary matrix at {path} has shape {matrix.shape}, expected {expected_shape}; rebuilding.")
+    build_vocab_matrix(path, vocab)
+    return np.load(path, mmap_mode="r")
+
+###############################################################################
+# Building Hybrid Vectors (against one artifact version)
+###############################################################################
+# Every function below takes an optional `artifacts` (a RetrievalArtifacts);
+# when omitted, the version that is current at call time is used.
 
-def build_hybrid_vector(user_text: str):
+def build_hybrid_vector(user_text: str, artifacts=None):
+    artifacts = artifacts or current_artifacts()
+    if artifacts.vocab_matrix is not None:
+        return build_hybrid_vector_from_matrix(user_text, artifacts)
+    return build_hybrid_vector_per_token(user_text, artifacts)
+
+def build_hybrid_vector_from_matrix(user_text: str, artifacts=None):
+    """TF-IDF weighted sum of vocabulary embeddings as one sparse-dense matmul."""
+    artifacts = artifacts or current_artifacts()
     clean_text = preprocess_text_for_retrieval(user_text)
-    user_tfidf = vectorizer.transform([clean_text])
-    tokens = clean_text.split()
-    
-    weighted_vecs = []
-    for token in tokens:
+    with timed("tfidf_transform"):
+        user_tfidf = artifacts.vectorizer.transform([clean_text])
+    with timed("vocab_matmul"):
+        vec_sum = np.asarray(user_tfidf @ artifacts.vocab_matrix).ravel()
+    norm = np.linalg.norm(vec_sum)
+    if norm > 0:
+        vec_sum = vec_sum / norm
+    return vec_sum
+
+def get_weighted_tokens(clean_text: str, tfidf_row, vocab: dict) -> list:
+    """(token, weight) for recognized tokens with a positive weight (repeats count again)."""
+    weighted_tokens = []
+    for token in clean_text.split():
         token_index = vocab.get(token)
         if token_index is not None:
-            weight = user_tfidf[0, token_index]
+            weight = tfidf_row[0, token_index]
             if weight > 0:
-                emb = get_token_embedding(token)
-                weighted_vecs.append(weight * emb)
-    if len(weighted_vecs) > 0:
-        vec_sum = np.sum(weighted_vecs, axis=0)
+                weighted_tokens.append((token, weight))
+    return weighted_tokens
+
+def build_hybrid_vector_per_token(user_text: str, artifacts=None):
+    artifacts = artifacts or current_artifacts()
+    clean_text = preprocess_text_for_retrieval(user_text)
+    with timed("tfidf_transform"):
+        user_tfidf = artifacts.vectorizer.transform([clean_text])
+    weighted_tokens = get_weighted_tokens(clean_text, user_tfidf, artifacts.vocab)
+
+    if len(weighted_tokens) > 0:
+        unique_tokens = list(dict.fromkeys(token for token, _ in weighted_tokens))
+        embeddings = token_cache.get_many(unique_tokens, encode_tokens)
+        vec_sum = np.sum([weight * embeddings[token] for token, weight in weighted_tokens], axis=0)
         norm = np.linalg.norm(vec_sum)
         if norm > 0:
             vec_sum = vec_sum / norm
@@ -136,66 +426,401 @@ def build_hybrid_vector(user_text: str):
         # If no recognized tokens or zero length
         return np.zeros(model.get_sentence_embedding_dimension())
 
+def build_hybrid_vectors(user_texts, backend=None, artifacts=None) -> np.ndarray:
+    """
+    Hybrid vectors for many answers at once, shape (len(user_texts), dim):
+    one TF-IDF transform and one embedding step for the whole batch.
+    Passing `backend` forces per-token encoding with that backend (uncached).
+    """
+    artifacts = artifacts or current_artifacts()
+    clean_texts = [preprocess_text_for_retrieval(t) for t in user_texts]
+    with timed("tfidf_transform"):
+        user_tfidf = artifacts.vectorizer.transform(clean_texts)
+
+    if backend is None and artifacts.vocab_matrix is not None:
+        with timed("vocab_matmul"):
+            vecs = np.asarray(user_tfidf @ artifacts.vocab_matrix)
+    else:
+        weighted = [
+            get_weighted_tokens(text, user_tfidf[row], artifacts.vocab)
+            for row, text in enumerate(clean_texts)
+        ]
+        unique_tokens = list(dict.fromkeys(token for tokens in weighted for token, _ in tokens))
+        if not unique_tokens:
+            embeddings = {}
+        elif backend is None:
+            embeddings = token_cache.get_many(unique_tokens, encode_tokens)
+        else:
+            embeddings = dict(zip(unique_tokens, backend.encode(unique_tokens, convert_to_numpy=True)))
+        dim = (backend or model).get_sentence_embedding_dimension()
+        vecs = np.zeros((len(clean_texts), dim))
+        for row, tokens in enumerate(weighted):
+            for token, weight in tokens:
+                vecs[row] += weight * embeddings[token]
+
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return np.divide(vecs, norms, out=np.zeros_like(vecs), where=norms > 0)
+
+def check_backend_tolerance(candidate, texts, reference=None, min_cosine: float = 0.99) -> dict:
+    """
+    Compare hybrid vectors built with `candidate` against the PyTorch model
+    (or `reference`) for the given answers. Passes when every pair has
+    cosine similarity >= min_cosine.
+    """
+    if reference is None:
+        reference = load_embedding_backend("torch", MODEL_NAME)
+    ref_vecs = build_hybrid_vectors(texts, backend=reference)
+    cand_vecs = build_hybrid_vectors(texts, backend=candidate)
+    if len(ref_vecs) == 0:
+        return {"count": 0, "min_cosine": 1.0, "mean_cosine": 1.0, "max_abs_diff": 0.0, "within_tolerance": True}
+
+    cosines = np.sum(ref_vecs * cand_vecs, axis=1)
+    both_zero = (np.linalg.norm(ref_vecs, axis=1) == 0) & (np.linalg.norm(cand_vecs, axis=1) == 0)
+    cosines = np.where(both_zero, 1.0, cosines)
+    return {
+        "count": len(cosines),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "max_abs_diff": float(np.abs(ref_vecs - cand_vecs).max()),
+        "within_tolerance": bool(cosines.min() >= min_cosine),
+    }
+
+
+###############################################################################
+# Per-question Chunk Index (stacked, pre-normalised, read-only vectors)
+###############################################################################
+# The index is cached with st.cache_resource and shared by every session and
+# thread, so nothing in it may be mutated after construction: all arrays are
+# flagged read-only and scoring always returns freshly built result records.
+#
+# Questions with at least ANN_MIN_CHUNKS chunks can additionally get an IVF
+# approximate index (see vector_index.py); smaller ones always use exact search.
+ANN_ENABLED = os.environ.get("DISC_ANN_ENABLED", "0") == "1"
+ANN_MIN_CHUNKS = int(os.environ.get("DISC_ANN_MIN_CHUNKS", "5000"))
+# Cells probed per query: higher = better recall, slower. Unset = nlist // 10.
+ANN_NPROBE = int(os.environ["DISC_ANN_NPROBE"]) if os.environ.get("DISC_ANN_NPROBE") else None
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    if array.flags.writeable:
+        array = array.view()
+        array.setflags(write=False)
+    return array
+
+class QuestionIndex:
+    """
+    All chunks of one question_id: an L2-normalised (k, dim) matrix plus
+    parallel arrays of DiSC type labels and chunk ids (positions in the source
+    pickle). The matrix is float32, float16, or int8 with per-row `scales`;
+    compact rows are dequantised block by block while scoring.
+    """
+    def __init__(self, vectors: np.ndarray, types: np.ndarray, chunk_ids: np.ndarray,
+                 ann: IVFIndex = None, scales: np.ndarray = None):
+        self.vectors = _read_only(vectors)
+        self.types = _read_only(types)
+        self.chunk_ids = _read_only(chunk_ids)
+        self.scales = None if scales is None else _read_only(scales)
+        self.ann = ann
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def similarities(self, user_vec: np.ndarray) -> np.ndarray:
+        """Cosine similarity of user_vec against every chunk (0 where undefined)."""
+        return dot_rows(self.vectors, normalise_rows(user_vec), self.scales)
+
+    def similarities_batch(self, user_vecs: np.ndarray) -> np.ndarray:
+        """Cosine similarities of many vectors at once, shape (len(user_vecs), k)."""
+        return dot_rows(self.vectors, normalise_rows(user_vecs).T, self.scales).T
+
+    @timed("chunk_search")
+    def search(self, user_vec: np.ndarray, n: int):
+        """(positions, sims) of the n most similar chunks, best first."""
+        query = normalise_rows(user_vec)
+        if self.ann is not None and query.any():
+            return self.ann.search(self.vectors, query, n, scales=self.scales)
+        return exact_search(self.vectors, query, n, self.scales)
+
+    @timed("chunk_search_batch")
+    def search_batch(self, user_vecs: np.ndarray, n: int) -> list:
+        """search() for many vectors; exact search scores them as one matrix product."""
+        if self.ann is not None:
+            return [self.search(user_vec, n) for user_vec in user_vecs]
+        results = []
+        for row_sims in self.similarities_batch(user_vecs):
+            top = top_n_indices(row_sims, n)
+            results.append((top, row_sims[top]))
+        return results
+
+def build_question_indexes(store: ColumnarChunks, ann_enabled: bool = ANN_ENABLED,
+                           ann_min_chunks: int = ANN_MIN_CHUNKS) -> dict:
+    """
+    One QuestionIndex per question_id. Vectors in the store are already
+    normalised and contiguous per question, so each matrix is a zero-copy view.
+    """
+    type_labels = np.array(store.types)
+    indexes = {}
+    for question_id, (start, stop) in store.question_ranges.items():
+        vectors = store.vectors[start:stop]
+        scales = None if store.vector_scales is None else store.vector_scales[start:stop]
+        ann = None
+        if ann_enabled and len(vectors) >= ann_min_chunks:
+            ann = IVFIndex.build(dequantise_rows(vectors, scales), nprobe=ANN_NPROBE)
+            print(f"Built IVF index for {question_id}: {len(vectors)} chunks, nlist={ann.nlist}, nprobe={ann.nprobe}.")
+        indexes[question_id] = QuestionIndex(
+            vectors=vectors,
+            types=type_labels[store.type_codes[start:stop]],
+            chunk_ids=store.chunk_ids[start:stop],
+            ann=ann,
+            scales=scales,
+        )
+    return indexes
+
+class ChunkIndex:
+    """Read-only mapping of question_id -> QuestionIndex for one chunk store."""
+    def __init__(self, store: ColumnarChunks, ann_enabled: bool = ANN_ENABLED,
+                 ann_min_chunks: int = ANN_MIN_CHUNKS):
+        self.store = store
+        self._questions = MappingProxyType(build_question_indexes(store, ann_enabled, ann_min_chunks))
+
+    def get(self, question_id: str):
+        return self._questions.get(question_id)
+
+    def __contains__(self, question_id: str) -> bool:
+        return question_id in self._questions
+
+    @property
+    def question_ids(self) -> list:
+        return list(self._questions)
+
+###############################################################################
+# Artifact Versions & Hot Reload
+###############################################################################
+# A RetrievalArtifacts bundles one consistent version of the vectorizer,
+# vocabulary matrix and chunk index. Each request reads current_artifacts()
+# once and uses that object throughout, so when the watcher swaps in a new
+# version, requests already running finish on the old one.
+
+class RetrievalArtifacts:
+    @timed("artifact_load")
+    def __init__(self, vectorizer_path: str, chunks_path: str):
+        self.vectorizer_path = vectorizer_path
+        self.chunks_path = chunks_path
+        self.vectorizer = load_vectorizer(vectorizer_path)
+        self.vocab = self.vectorizer.vocabulary_
+        self.vocab_matrix = (
+            load_vocab_matrix(vocab_matrix_path_for(vectorizer_path), self.vocab)
+            if vocab_matrix_enabled(self.vectorizer) else None
+        )
+        self.chunk_store = load_chunk_store(chunks_path, store_path_for(chunks_path))
+        self.chunk_index = ChunkIndex(self.chunk_store)
+
+    @property
+    def version(self) -> tuple:
+        return (os.path.basename(self.vectorizer_path), os.path.basename(self.chunks_path))
+
+_artifacts_lock = threading.Lock()
+# A plain module global (not st.cache_resource), so a swapped-out version is
+# only referenced by requests still running on it
+_current_artifacts = RetrievalArtifacts(vectorizer_path, chunks_path)
+
+def current_artifacts() -> RetrievalArtifacts:
+    return _current_artifacts
+
+def _publish_artifacts(artifacts: RetrievalArtifacts):
+    """Swap in a new version. Module-level aliases are kept for older callers."""
+    global _current_artifacts, vectorizer, vocab, vocab_matrix, chunks, chunk_index
+    with _artifacts_lock:
+        _current_artifacts = artifacts
+        vectorizer = artifacts.vectorizer
+        vocab = artifacts.vocab
+        vocab_matrix = artifacts.vocab_matrix
+        chunks = artifacts.chunk_store
+        chunk_index = artifacts.chunk_index
+
+def _commit_artifacts(artifacts: RetrievalArtifacts):
+    if LOCAL_ARTIFACTS_DIR:
+        return
+    commit_artifact("embeddings/disc_tfidf_vectorizer.pkl", artifacts.vectorizer_path)
+    commit_artifact("embeddings/disc_tfidf_chunks.pkl", artifacts.chunks_path)
+
+_publish_artifacts(_current_artifacts)
+_commit_artifacts(_current_artifacts)
+
+def reload_artifacts_if_changed() -> bool:
+    """
+    Re-check both blobs' generations. If either changed, build the new version
+    here (off the request path) and swap it in. Returns True on a swap.
+    """
+    if LOCAL_ARTIFACTS_DIR:
+        return False
+    new_vectorizer_path = fetch_artifact(bucket_name, "embeddings/disc_tfidf_vectorizer.pkl")
+    new_chunks_path = fetch_artifact(bucket_name, "embeddings/disc_tfidf_chunks.pkl")
+    current = current_artifacts()
+    if (new_vectorizer_path, new_chunks_path) == (current.vectorizer_path, current.chunks_path):
+        return False
+    artifacts = RetrievalArtifacts(new_vectorizer_path, new_chunks_path)
+    _publish_artifacts(artifacts)
+    _commit_artifacts(artifacts)
+    print(f"Swapped retrieval artifacts {current.version} -> {artifacts.version}.")
+    return True
+
+# Seconds between generation checks; 0 disables the watcher
+HOT_RELOAD_INTERVAL_S = float(os.environ.get("DISC_HOT_RELOAD_INTERVAL_S", "0"))
+
+class ArtifactWatcher(threading.Thread):
+    """Daemon thread that polls GCS and hot-swaps new artifact versions."""
+    def __init__(self, interval_s: float):
+        super().__init__(name="disc-artifact-watcher", daemon=True)
+        self.interval_s = interval_s
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_s):
+            try:
+                reload_artifacts_if_changed()
+            except Exception as e:
+                print(f"Artifact reload failed; keeping current version: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+@st.cache_resource
+def start_artifact_watcher(interval_s: float = HOT_RELOAD_INTERVAL_S):
+    if interval_s <= 0:
+        return None
+    watcher = ArtifactWatcher(interval_s)
+    watcher.start()
+    return watcher
+
+artifact_watcher = start_artifact_watcher()
 
 ###############################################################################
 # retrieve_top_n with negation switch
 ###############################################################################
-def retrieve_top_n(user_answer: str, question_id: str, n=1):
-    user_vec = build_hybrid_vector(user_answer)
+@timed("retrieve_top_n")
+def retrieve_top_n(user_answer: str, question_id: str, n=1, artifacts=None):
+    artifacts = artifacts or current_artifacts()
+    user_vec = build_hybrid_vector(user_answer, artifacts)
 
-    # Filter chunks by question_id
-    relevant = [c for c in chunks if c["question_id"] == question_id]
-    
-    scored = []
-    for c in relevant:
-        chunk_vec = c["hybrid_vector"]  # from your pickled data
-        dot = np.dot(user_vec, chunk_vec)
-        denom = np.linalg.norm(user_vec) * np.linalg.norm(chunk_vec)
-        sim = dot / denom if denom != 0 else 0
-        scored.append((sim, c))
-    
-    scored.sort(key=lambda x: x[0], reverse=True)
-    
-    if not scored:
+    index = artifacts.chunk_index.get(question_id)
+    if index is None or len(index) == 0:
         return []
-    
-    best_sim, best_chunk = scored[0]
-    
-    if contains_negation(user_answer):
-        original_type = best_chunk["type"]
-        # Switch sets
-        if question_id in ["Q1", "Q2", "Q5"]:
-            new_type = switch_type_set_1(original_type)
-        elif question_id in ["Q3", "Q4", "Q6"]:
-            new_type = switch_type_set_2(original_type)
+
+    positions, sims = index.search(user_vec, n)
+    return rank_chunks(user_answer, question_id, index, positions, sims)
+
+def rank_chunks(user_answer: str, question_id: str, index: QuestionIndex, positions, sims):
+    """
+    (similarity, result) pairs for the chunks at `positions` (best first, with
+    their `sims`). Each result is a new dict with the chunk's "chunk_id",
+    "question_id", "original_type" and the effective "type", which is
+    negation-switched for the best result.
+    """
+    negated = contains_negation(user_answer)
+    scored = []
+    for rank, (i, sim) in enumerate(zip(positions, sims)):
+        original_type = str(index.types[i])
+        if rank == 0 and negated:
+            effective_type = negation_switched_type(question_id, original_type)
         else:
-            new_type = original_type
-        
-        # Overwrite type for display
-        best_chunk["type"] = new_type
-        scored[0] = (best_sim, best_chunk)
-    
-    return scored[:n]
+            effective_type = original_type
+        scored.append((float(sim), {
+            "chunk_id": int(index.chunk_ids[i]),
+            "question_id": question_id,
+            "original_type": original_type,
+            "type": effective_type,
+        }))
+    return scored
+
+###############################################################################
+# Batch retrieval (many answers, possibly across questions)
+###############################################################################
+@timed("retrieve_top_n_batch")
+def retrieve_top_n_batch(answers, question_ids, n=1, artifacts=None, backend=None):
+    """
+    retrieve_top_n for many answers in one go. answers[i] is scored against
+    question_ids[i]; the return value is a list of top-n lists in the same order.
+    `backend` is passed to build_hybrid_vectors (per-token, uncached encoding).
+    """
+    answers = list(answers)
+    question_ids = list(question_ids)
+    if len(answers) != len(question_ids):
+        raise ValueError("answers and question_ids must have the same length")
+    results = [[] for _ in answers]
+    if not answers:
+        return results
+
+    artifacts = artifacts or current_artifacts()
+    user_vecs = build_hybrid_vectors(answers, backend=backend, artifacts=artifacts)
+
+    rows_by_question = {}
+    for row, question_id in enumerate(question_ids):
+        rows_by_question.setdefault(question_id, []).append(row)
+
+    for question_id, rows in rows_by_question.items():
+        index = artifacts.chunk_index.get(question_id)
+        if index is None or len(index) == 0:
+            continue
+        for row, (positions, sims) in zip(rows, index.search_batch(user_vecs[rows], n)):
+            results[row] = rank_chunks(answers[row], question_id, index, positions, sims)
+    return results
 
 ###############################################################################
 # A helper to check max similarity (for relevance filter)
 ###############################################################################
-def get_max_similarity(user_answer: str, question_id: str) -> float:
+@timed("get_max_similarity")
+def get_max_similarity(user_answer: str, question_id: str, artifacts=None) -> float:
     """
     Returns the highest similarity (0..1) among all chunks for that question_id,
     given the user's answer.
     """
-    user_vec = build_hybrid_vector(user_answer)
-    relevant = [c for c in chunks if c["question_id"] == question_id]
-    if not relevant:
+    artifacts = artifacts or current_artifacts()
+    user_vec = build_hybrid_vector(user_answer, artifacts)
+    index = artifacts.chunk_index.get(question_id)
+    if index is None or len(index) == 0:
         return 0.0
-    
-    scores = []
-    for c in relevant:
-        chunk_vec = c["hybrid_vector"]
-        dot = np.dot(user_vec, chunk_vec)
-        denom = np.linalg.norm(user_vec) * np.linalg.norm(chunk_vec)
-        sim = dot / denom if denom != 0 else 0
-        scores.append(sim)
-    
-    return max(scores) if scores else 0.0
+    _, sims = index.search(user_vec, 1)
+    return float(sims[0])
+
+###############################################################################
+# Single-pass scoring used by the question pages
+###############################################################################
+@timed("score_answer")
+def score_answer(user_answer: str, question_id: str, n=1, threshold=0.4, artifacts=None) -> dict:
+    """
+    Vectorises the answer once and scores it once, returning
+    {"max_similarity": float, "is_relevant": bool, "similarities": top-n list}.
+    "similarities" is only filled in when the answer clears the threshold.
+    """
+    artifacts = artifacts or current_artifacts()
+    user_vec = build_hybrid_vector(user_answer, artifacts)
+    index = artifacts.chunk_index.get(question_id)
+    if index is None or len(index) == 0:
+        return {"max_similarity": 0.0, "is_relevant": 0.0 >= threshold, "similarities": []}
+
+    positions, sims = index.search(user_vec, max(n, 1))
+    max_sim = float(sims[0])
+    is_relevant = max_sim >= threshold
+    top = rank_chunks(user_answer, question_id, index, positions[:n], sims[:n]) if is_relevant else []
+    return {"max_similarity": max_sim, "is_relevant": is_relevant, "similarities": top}
+
+###############################################################################
+# Final DiSC totals (as shown on the result page)
+###############################################################################
+DISC_TYPES = ("D", "I", "S", "C")
+
+def disc_totals(similarity_lists) -> dict:
+    """Sum of similarities per effective DiSC type over each question's top-n list."""
+    totals = {t: 0.0 for t in DISC_TYPES}
+    for similarities in similarity_lists:
+        for sim, chunk in similarities:
+            if chunk["type"] in totals:
+                totals[chunk["type"]] += sim
+    return totals
+
+def disc_percentages(totals: dict) -> dict:
+    """Each type's share of the totals in percent, or None when nothing scored."""
+    total_all = sum(totals.values())
+    if total_all <= 0:
+        return None
+    return {t: (totals[t] / total_all) * 100 for t in DISC_TYPES}
@@ -1,16 +1,18 @@
 import streamlit as st
 import numpy as np
-from retrieval import retrieve_top_n, get_max_similarity
+from retrieval import score_answer, disc_totals, disc_percentages
 import google.generativeai as palm
 from retrieval import vectorizer, chunks
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from instrumentation import timed, start_timing_reporter
+from profiling import profile_rerun
+from upload_queue import UploadQueue
+from results_loader import IncrementalCSVLoader
+from quadrant_chart import render_quadrant_chart
 import json
 from google.cloud import storage
 from google.oauth2 import service_account
 from datetime import datetime
 import uuid
-import os
 import pandas as pd
 import io
 
@@ -20,15 +22,29 @@ service_account_info = json.loads(service_account_json)
 credentials = service_account.Credentials.from_service_account_info(service_account_info)
 client = storage.Client(credentials=credentials, project=service_account_info["project_id"])
 
+# Stage timers (DISC_TIMING=1); one reporter per process
+@st.cache_resource
+def load_timing_reporter():
+    return start_timing_reporter()
+
+timing_reporter = load_timing_reporter()
+
 # def upload df candidaet profile and result to the bucket
-def upload_to_gcs(bucket_name, destination_blob_name, local_file_path):
+@timed("gcs_upload")
+def upload_bytes_to_gcs(bucket_name, destination_blob_name, data, content_type="text/csv"):
     """
-    Uploads a local file to Google Cloud Storage.
+    Uploads in-memory bytes to Google Cloud Storage (one attempt; raises on failure).
     """
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(local_file_path)
-  #  st.success(f"File uploaded to GCS: gs://{bucket_name}/{destination_blob_name}")
+    blob.upload_from_string(data, content_type=content_type, timeout=60)
+
+# Result uploads run in the background with retries; see upload_queue.py
+@st.cache_resource
+def load_upload_queue():
+    return UploadQueue(upload_bytes_to_gcs)
+
+upload_queue = load_upload_queue()
 
 
 ###############################################################################
@@ -125,29 +141,20 @@ import pandas as pd
 from google.cloud import storage
 from google.oauth2 import service_account
 
+# One incremental loader per (bucket, prefix), shared by every HR session
+@st.cache_resource
+def load_results_loader(bucket_name, prefix):
+    return IncrementalCSVLoader(client, bucket_name, prefix)
+
+@timed("csv_merge")
 def merge_csv_from_gcs(bucket_name, prefix):
-    """Helper function to merge multiple CSVs from GCS into a single DataFrame."""
-    service_account_json = st.secrets["general"]["GOOGLE_APPLICATION_CREDENTIALS_JSON"]
-    service_account_info = json.loads(service_account_json)
-    credentials = service_account.Credentials.from_service_account_info(service_account_info)
-    storage_client = storage.Client(credentials=credentials, project=service_account_info["project_id"])
-    
-    bucket = storage_client.get_bucket(bucket_name)
-    blobs = bucket.list_blobs(prefix=prefix)
-    
-    df_list = []
-    for blob in blobs:
-        if blob.name.endswith(".csv"):
-            csv_data = blob.download_as_text()
-            df_temp = pd.read_csv(io.StringIO(csv_data))
-            df_list.append(df_temp)
-    
-    if df_list:
-        df_merged = pd.concat(df_list, ignore_index=True)
-        return df_merged
-    else:
-        return pd.DataFrame()
+    """
+    Helper function to merge multiple CSVs from GCS into a single DataFrame.
+    Only new or changed files are downloaded (in parallel); see results_loader.py.
+    """
+    return load_results_loader(bucket_name, prefix).load()
 
+@timed("position_trait_download")
 def get_position_trait_data(bucket_name, file_path):
     """Fetch the position_trait_v1.csv from GCS and return as a DataFrame."""
     service_account_json = st.secrets["general"]["GOOGLE_APPLICATION_CREDENTIALS_JSON"]
@@ -202,19 +209,17 @@ def chat_with_candidate_result_page():
     # 2) PREPARE DATA
     bucket_name = "streamlit-disc-candidate-bucket"
     prefix = "disc_results/"
-    df_merged = merge_csv_from_gcs(bucket_name, prefix)
-
     trait_file_path = "position_trait/position_trait_v1.csv"
-    df_position_trait = get_position_trait_data(bucket_name, trait_file_path)
 
+    # Loaded once per session; later reruns reuse the session copies
     if "df_merged" not in st.session_state:
-        st.session_state["df_merged"] = df_merged
+        st.session_state["df_merged"] = merge_csv_from_gcs(bucket_name, prefix)
     if "df_position_trait" not in st.session_state:
-        st.session_state["df_position_trait"] = df_position_trait
+        st.session_state["df_position_trait"] = get_position_trait_data(bucket_name, trait_file_path)
 
     # For OpenAI context
     if "candidate_data_str" not in st.session_state:
-        st.session_state["candidate_data_str"] = df_merged.to_csv(index=False)
+        st.session_state["candidate_data_str"] = st.session_state["df_merged"].to_csv(index=False)
 
     # 3) INITIALIZE CHAT HISTORY
     if "chat_history" not in st.session_state:
@@ -266,11 +271,12 @@ def chat_with_candidate_result_page():
                 {"role": "system", "content": f"Candidate Data:\n{candidate_data_context}"},
                 {"role": "user", "content": prompt_text}
             ]
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7
-            )
+            with timed("openai_call"):
+                response = openai.ChatCompletion.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    temperature=0.7
+                )
             return response.choices[0].message.content
         except Exception as e:
             st.error(f"Error calling OpenAI API: {e}")
@@ -441,6 +447,10 @@ def candidate_form_page():
                 # We'll store final disc data (similarities) here
                 if "disc_data" not in st.session_state:
                     st.session_state.disc_data = {}
+
+                # Stable ID for this assessment; the result page finalises it once
+                st.session_state.assessment_id = str(uuid.uuid4())
+                st.session_state.pop("disc_result", None)
                 
                 navigate_to("question_1")
 
@@ -488,16 +498,15 @@ def question_1_page():
             st.warning("The answer is too short, please provide more detail.")
             return
 
-        sim = get_max_similarity(st.session_state.q1_response, "Q1")
-        if sim < 0.4:
+        result = score_answer(st.session_state.q1_response, "Q1", n=4, threshold=0.4)
+        if not result["is_relevant"]:
             st.warning("Your answer is not relevant. Please answer again.")
             return
 
-        sims = retrieve_top_n(st.session_state.q1_response, "Q1", n=4)
         st.session_state.disc_data["Q1"] = {
             "answer": st.session_state.q1_response,
             "word_count": word_count,
-            "similarities": sims
+            "similarities": result["similarities"]
         }
         navigate_to("question_2")
 
@@ -536,16 +545,15 @@ def question_2_page():
             st.warning("The answer is too short, please provide more detail.")
             return
 
-        sim = get_max_similarity(st.session_state.q2_response, "Q2")
-        if sim < 0.4:
+        result = score_answer(st.session_state.q2_response, "Q2", n=4, threshold=0.4)
+        if not result["is_relevant"]:
             st.warning("Your answer is not relevant. Please answer again.")
             return
 
-        sims = retrieve_top_n(st.session_state.q2_response, "Q2", n=4)
         st.session_state.disc_data["Q2"] = {
             "answer": st.session_state.q2_response,
             "word_count": word_count,
-            "similarities": sims
+            "similarities": result["similarities"]
         }
         navigate_to("question_3")
 
@@ -584,16 +592,15 @@ def question_3_page():
             st.warning("The answer is too short, please provide more detail.")
             return
 
-        sim = get_max_similarity(st.session_state.q3_response, "Q3")
-        if sim < 0.4:
+        result = score_answer(st.session_state.q3_response, "Q3", n=4, threshold=0.4)
+        if not result["is_relevant"]:
             st.warning("Your answer is not relevant. Please answer again.")
             return
 
-        sims = retrieve_top_n(st.session_state.q3_response, "Q3", n=4)
         st.session_state.disc_data["Q3"] = {
             "answer": st.session_state.q3_response,
             "word_count": word_count,
-            "similarities": sims
+            "similarities": result["similarities"]
         }
         navigate_to("question_4")
 
@@ -631,16 +638,15 @@ def question_4_page():
             st.warning("The answer is too short, please provide more detail.")
             return
 
-        sim = get_max_similarity(st.session_state.q4_response, "Q4")
-        if sim < 0.4:
+        result = score_answer(st.session_state.q4_response, "Q4", n=4, threshold=0.4)
+        if not result["is_relevant"]:
             st.warning("Your answer is not relevant. Please answer again.")
             return
 
-        sims = retrieve_top_n(st.session_state.q4_response, "Q4", n=4)
         st.session_state.disc_data["Q4"] = {
             "answer": st.session_state.q4_response,
             "word_count": word_count,
-            "similarities": sims
+            "similarities": result["similarities"]
         }
         navigate_to("question_5")
 
@@ -678,16 +684,15 @@ def question_5_page():
             st.warning("The answer is too short, please provide more detail.")
             return
 
-        sim = get_max_similarity(st.session_state.q5_response, "Q5")
-        if sim < 0.4:
+        result = score_answer(st.session_state.q5_response, "Q5", n=4, threshold=0.4)
+        if not result["is_relevant"]:
             st.warning("Your answer is not relevant. Please answer again.")
             return
 
-        sims = retrieve_top_n(st.session_state.q5_response, "Q5", n=4)
         st.session_state.disc_data["Q5"] = {
             "answer": st.session_state.q5_response,
             "word_count": word_count,
-            "similarities": sims
+            "similarities": result["similarities"]
         }
         navigate_to("question_6")
 
@@ -725,79 +730,95 @@ def question_6_page():
             st.warning("The answer is too short, please provide more detail.")
             return
 
-        sim = get_max_similarity(st.session_state.q6_response, "Q6")
-        if sim < 0.4:
+        result = score_answer(st.session_state.q6_response, "Q6", n=4, threshold=0.4)
+        if not result["is_relevant"]:
             st.warning("Your answer is not relevant. Please answer again.")
             return
 
-        sims = retrieve_top_n(st.session_state.q6_response, "Q6", n=4)
         st.session_state.disc_data["Q6"] = {
             "answer": st.session_state.q6_response,
             "word_count": word_count,
-            "similarities": sims
+            "similarities": result["similarities"]
         }
         navigate_to("disc_result")
 
 ###############################################################################
 # 5) DISC RESULT PAGE: final type + description
 ###############################################################################
-def disc_result_page():
-    add_base_styles()
-    st.title("Your DiSC Assessment Results")
+def build_answers_frame(disc_data):
+    """One row per question: the answer and its D/I/S/C cosine similarities."""
+    # Build a row for each question: answer, D similarity, I similarity, S similarity, C similarity
+    rows = []
+    for qid in ["Q1", "Q2", "Q3", "Q4", "Q5", "Q6"]:
+        answer_text = disc_data[qid]["answer"]
+        # Initialize D, I, S, C for each question
+        similarity_map = {"D": 0.0, "I": 0.0, "S": 0.0, "C": 0.0}
+        for sim, chunk in disc_data[qid]["similarities"]:
+            disc_type = chunk["type"]
+            # Assign that similarity
+            similarity_map[disc_type] = sim
 
-    if "disc_data" not in st.session_state or len(st.session_state.disc_data) < 6:
-        st.warning("Please complete all 6 questions first.")
-        return
+        row = {
+            "answer": answer_text,
+            "D cosine similarity": similarity_map["D"],
+            "I cosine similarity": similarity_map["I"],
+            "S cosine similarity": similarity_map["S"],
+            "C cosine similarity": similarity_map["C"]
+        }
+        rows.append(row)
 
+    return pd.DataFrame(
+        rows, 
+        columns=[
+            "answer",
+            "D cosine similarity",
+            "I cosine similarity",
+            "S cosine similarity",
+            "C cosine similarity",
+        ]
+    )
+
+def finalise_assessment():
+    """
+    One-time result step for the current assessment: totals, percentages,
+    result CSVs, chart and upload jobs. The result is kept in
+    st.session_state.disc_result under the assessment ID, so later reruns of
+    the result page reuse it instead of recomputing and re-uploading.
+    Returns None when no answer scored.
+    """
+    assessment_id = st.session_state.setdefault("assessment_id", str(uuid.uuid4()))
     disc_data = st.session_state.disc_data
+    answers = tuple(disc_data[qid]["answer"] for qid in ["Q1", "Q2", "Q3", "Q4", "Q5", "Q6"])
+    cached = st.session_state.get("disc_result")
+    if cached is not None and cached["assessment_id"] == assessment_id:
+        if cached["answers"] == answers:
+            return cached
+        # Answers changed after finalising: that is a new assessment with its
+        # own ID, so no two uploaded results share a "Unique ID"
+        assessment_id = st.session_state.assessment_id = str(uuid.uuid4())
 
     # Summation across all Qs
-    total_D = 0.0
-    total_I = 0.0
-    total_S = 0.0
-    total_C = 0.0
-
     # เราทราบว่า st.session_state.disc_data[qid]["similarities"]
     # คือ list ของ (similarity, chunk)
-    for qid in ["Q1", "Q2", "Q3", "Q4", "Q5", "Q6"]:
-        sims = st.session_state.disc_data[qid]["similarities"]
-        for sim, chunk in sims:
-            disc_type = chunk["type"]  # ตรงกับใน retrieval.py
-            if disc_type == "D":
-                total_D += sim
-            elif disc_type == "I":
-                total_I += sim
-            elif disc_type == "S":
-                total_S += sim
-            elif disc_type == "C":
-                total_C += sim
+    final_scores = disc_totals(disc_data[qid]["similarities"] for qid in ["Q1", "Q2", "Q3", "Q4", "Q5", "Q6"])
 
     # Normalize to percentages
-    total_all = total_D + total_I + total_S + total_C
-    if total_all <= 0:
-        st.error("No valid similarity data found. Please ensure your answers were relevant.")
-        return
-
-    pct_D = (total_D / total_all) * 100
-    pct_I = (total_I / total_all) * 100
-    pct_S = (total_S / total_all) * 100
-    pct_C = (total_C / total_all) * 100
-
+    percentages = disc_percentages(final_scores)
+    if percentages is None:
+        return None
 
     # Pick the best dimension
-    final_scores = {"D": total_D, "I": total_I, "S": total_S, "C": total_C}
     best_type = max(final_scores, key=final_scores.get)
-    
-    # --- Generate timestamp and unique ID ---
+
+    # --- Timestamp fixed at finalisation; the assessment ID is the unique ID ---
     current_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")  # e.g., "2024-07-31_13-45-00"
-    unique_id = str(uuid.uuid4())  # e.g., "bd65600d-8669-4903-8a14-af88203add38"
 
     # Gather candidate info
     candidate_info = st.session_state["candidate_data"]  # from candidate_form_page
 
     # Create DataFrame
     df = pd.DataFrame([{
-        "Unique ID": unique_id,
+        "Unique ID": assessment_id,
         "Timestamp": current_timestamp,           # store timestamp
         "Name": candidate_info["name"],
         "Surname": candidate_info["surname"],
@@ -805,158 +826,84 @@ def disc_result_page():
         "Gender": candidate_info["gender"],
         "Applied Position": candidate_info["applied_position"],
         "DiSC Result": best_type,
-        "D score percentage": pct_D,
-        "I score percentage": pct_I,
-        "S score percentage": pct_S,
-        "C score percentage": pct_C
+        "D score percentage": percentages["D"],
+        "I score percentage": percentages["I"],
+        "S score percentage": percentages["S"],
+        "C score percentage": percentages["C"]
     }])
+    df_answers = build_answers_frame(disc_data)
+
+    # ===== Upload the CSVs to GCS =====
+    # The CSVs stay in memory (no shared temp file between sessions) and are
+    # uploaded in the background with retries, so the page does not wait on GCS.
+    # In the filename, include the name, surname, and timestamp. 
+    # For instance: "disc_results/John_Doe_2024-07-31_13-45-00.csv"
+    bucket_name = "streamlit-disc-candidate-bucket"
+    destination_blob_name = f"disc_results/{candidate_info['name']}_{candidate_info['surname']}_{current_timestamp}.csv"
+    # The user wants something like: "(New folder name)/Name_Surname_2025-01-02_12-34-56.csv"
+    new_folder_blob = f"(answers_result)/{candidate_info['name']}_{candidate_info['surname']}_{current_timestamp}.csv"
+
+    upload_jobs = {
+        destination_blob_name: upload_queue.submit(bucket_name, destination_blob_name, df.to_csv(index=False).encode("utf-8")),
+        new_folder_blob: upload_queue.submit(bucket_name, new_folder_blob, df_answers.to_csv(index=False).encode("utf-8")),
+    }
+
+    # The chart is rendered once here and stored (SVG text or PNG bytes), not as a live figure
+    result = {
+        "assessment_id": assessment_id,
+        "answers": answers,
+        "timestamp": current_timestamp,
+        "final_scores": final_scores,
+        "percentages": percentages,
+        "best_type": best_type,
+        "chart": render_quadrant_chart(percentages),
+        "upload_jobs": upload_jobs,
+    }
+    st.session_state.disc_result = result
+    return result
+
+@timed("disc_result_page")
+def disc_result_page():
+    add_base_styles()
+    st.title("Your DiSC Assessment Results")
+
+    if "disc_data" not in st.session_state or len(st.session_state.disc_data) < 6:
+        st.warning("Please complete all 6 questions first.")
+        return
+
+    result = finalise_assessment()
+    if result is None:
+        st.error("No valid similarity data found. Please ensure your answers were relevant.")
+        return
+
+    percentages = result["percentages"]
+    best_type = result["best_type"]
 
     # --- LAYOUT: left for text, right for graph
     col_left, col_right = st.columns([1.3, 1])
 
     with col_left:
         st.subheader("Your DiSC Distribution:")
-        st.write(f"- **D (Dominance)**: {pct_D:.2f}%")
-        st.write(f"- **I (Influence)**: {pct_I:.2f}%")
-        st.write(f"- **S (Steadiness)**: {pct_S:.2f}%")
-        st.write(f"- **C (Conscientiousness)**: {pct_C:.2f}%")
+        st.write(f"- **D (Dominance)**: {percentages['D']:.2f}%")
+        st.write(f"- **I (Influence)**: {percentages['I']:.2f}%")
+        st.write(f"- **S (Steadiness)**: {percentages['S']:.2f}%")
+        st.write(f"- **C (Conscientiousness)**: {percentages['C']:.2f}%")
         st.success(f"Your primary DiSC style seems to be: {best_type}")
 
 
-    # --- Build the quadrant graph on the right
+    # --- Quadrant graph on the right (built once per assessment)
     with col_right:
-        fig, ax = plt.subplots(figsize=(4, 4))
-
-        # Draw the four color “squares” 
-        # D=green (top-left), I=red (top-right), C=yellow (bottom-left), S=blue (bottom-right)
-        ax.add_patch(patches.Rectangle((-100, 0), 100, 100, 
-                                       facecolor="#A8D5A2", alpha=0.3))  # top-left D
-        ax.add_patch(patches.Rectangle((0, 0), 100, 100, 
-                                       facecolor="#F4A8A8", alpha=0.3))  # top-right I
-        ax.add_patch(patches.Rectangle((-100, -100), 100, 100, 
-                                       facecolor="#FAF3AD", alpha=0.3)) # bottom-left C
-        ax.add_patch(patches.Rectangle((0, -100), 100, 100, 
-                                       facecolor="#A8D7F4", alpha=0.3))  # bottom-right S
-
-        # Thin lines for X=0 and Y=0
-        ax.axhline(0, color='black', linewidth=1)
-        ax.axvline(0, color='black', linewidth=1)
-
-        # Place transparent big letters in each quadrant
-        ax.text(-50, 50, "D", fontsize=100, color="gray", alpha=0.2,
-                ha="center", va="center")
-        ax.text(50, 50, "I", fontsize=100, color="gray", alpha=0.2,
-                ha="center", va="center")
-        ax.text(-50, -50, "C", fontsize=100, color="gray", alpha=0.2,
-                ha="center", va="center")
-        ax.text(50, -50, "S", fontsize=100, color="gray", alpha=0.2,
-                ha="center", va="center")
-
-        # Coordinates by your quadrant rule:
-        # I => (+pct_I, +pct_I)  [top-right]
-        # D => (-pct_D, +pct_D)  [top-left]
-        # C => (-pct_C, -pct_C)  [bottom-left]
-        # S => (+pct_S, -pct_S)  [bottom-right]
-        xD, yD = -pct_D, +pct_D
-        xI, yI = +pct_I, +pct_I
-        xC, yC = -pct_C, -pct_C
-        xS, yS = +pct_S, -pct_S
-
-        # Plot each point
-        ax.plot(xD, yD, 'ko', markersize=6)
-        ax.plot(xI, yI, 'ko', markersize=6)
-        ax.plot(xC, yC, 'ko', markersize=6)
-        ax.plot(xS, yS, 'ko', markersize=6)
-
-        # Connect them with a polygon, e.g. D -> I -> S -> C -> D
-        ax.plot([xD, xI, xS, xC, xD],
-                [yD, yI, yS, yC, yD],
-                color='black', linewidth=1)
-
-        # Set the bounds & remove ticks
-        ax.set_xlim([-100, 100])
-        ax.set_ylim([-100, 100])
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.set_aspect('equal')
-
-        st.pyplot(fig)
+        chart = result["chart"]
+        if chart["format"] == "svg":
+            st.markdown(chart["data"], unsafe_allow_html=True)
+        else:
+            st.image(chart["data"])
 
     # Show the standard description
     show_disc_description(best_type)
     
     st.success(f"Thank you very much for your time. Please go through the link to evaluate this project : https://forms.gle/oPcrYYaDc1FwhuA26 ")
 
-    # ===== Save the CSV locally =====
-    # You can choose any file path. We'll just keep it in the current working directory for clarity.
-    #local_file_path = "tmp/candidate_disc_result.csv"
-    #df.to_csv(local_file_path, index=False)
-    #st.info(f"CSV saved locally: {os.path.abspath(local_file_path)}")
-
-    # ===== Save the CSV locally =====
-    # Ensure the tmp directory exists
-
-    base_dir = os.path.dirname(os.path.abspath(__file__))  # ตำแหน่งเดียวกับไฟล์ streamlit_app.py
-    tmp_dir = os.path.join(base_dir, "tmp")
-
-    if not os.path.exists(tmp_dir):
-        os.makedirs(tmp_dir)
-
-    local_file_path = os.path.join(tmp_dir, "candidate_disc_result.csv")
-    df.to_csv(local_file_path, index=False)
-    #st.info(f"CSV saved locally: {os.path.abspath(local_file_path)}")
-
-    # ===== Upload the CSV to GCS =====
-    # In the filename, include the name, surname, and timestamp. 
-    # For instance: "disc_results/John_Doe_2024-07-31_13-45-00.csv"
-    bucket_name = "streamlit-disc-candidate-bucket"
-    destination_blob_name = f"disc_results/{candidate_info['name']}_{candidate_info['surname']}_{current_timestamp}.csv"
-
-    upload_to_gcs(bucket_name, destination_blob_name, local_file_path)
-    
-    # --- Save detailed answers + similarities as a new CSV ---
-    # Build a row for each question: answer, D similarity, I similarity, S similarity, C similarity
-    rows = []
-    for qid in ["Q1", "Q2", "Q3", "Q4", "Q5", "Q6"]:
-        answer_text = st.session_state.disc_data[qid]["answer"]
-        # Initialize D, I, S, C for each question
-        similarity_map = {"D": 0.0, "I": 0.0, "S": 0.0, "C": 0.0}
-        for sim, chunk in st.session_state.disc_data[qid]["similarities"]:
-            disc_type = chunk["type"]
-            # Assign that similarity
-            similarity_map[disc_type] = sim
-
-        row = {
-            "answer": answer_text,
-            "D cosine similarity": similarity_map["D"],
-            "I cosine similarity": similarity_map["I"],
-            "S cosine similarity": similarity_map["S"],
-            "C cosine similarity": similarity_map["C"]
-        }
-        rows.append(row)
-
-    df_answers = pd.DataFrame(
-        rows, 
-        columns=[
-            "answer",
-            "D cosine similarity",
-            "I cosine similarity",
-            "S cosine similarity",
-            "C cosine similarity",
-        ]
-    )
-
-    # Save the new answers DataFrame as CSV locally
-    answers_file_path = os.path.join(tmp_dir, "candidate_answers_disc_sim.csv")
-    df_answers.to_csv(answers_file_path, index=False)
-    #st.info(f"Answers + Similarities CSV saved locally: {os.path.abspath(answers_file_path)}")
-
-    # Upload this CSV to a *new folder* in GCS
-    # The user wants something like: "(New folder name)/Name_Surname_2025-01-02_12-34-56.csv"
-    new_folder_blob = f"(answers_result)/{candidate_info['name']}_{candidate_info['surname']}_{current_timestamp}.csv"
-    upload_to_gcs(bucket_name, new_folder_blob, answers_file_path)
-   # st.success("Detailed answers + similarity file has been uploaded to GCS in the new folder!")
-
 
 def show_disc_description(disc_type):
     """Display the final text block for the chosen type."""
@@ -1035,30 +982,32 @@ def main():
 
     # Router logic
     page = st.session_state.page
-    if page == "user_selection":
-        user_selection_page()
-    elif page == "hr_form":
-        hr_form_page()
-    elif page == "chat_with_candidate_result_page":
-        chat_with_candidate_result_page()
-    elif page == "candidate_form":
-        candidate_form_page()
-    elif page == "question_1":
-        question_1_page()
-    elif page == "question_2":
-        question_2_page()
-    elif page == "question_3":
-        question_3_page()
-    elif page == "question_4":
-        question_4_page()
-    elif page == "question_5":
-        question_5_page()
-    elif page == "question_6":
-        question_6_page()
-    elif page == "disc_result":
-        disc_result_page()
-    else:
-        user_selection_page()
+    # DISC_PROFILE=1 saves a cProfile capture of this rerun, tagged with the page
+    with profile_rerun(page), timed(f"page_{page}"):
+        if page == "user_selection":
+            user_selection_page()
+        elif page == "hr_form":
+            hr_form_page()
+        elif page == "chat_with_candidate_result_page":
+            chat_with_candidate_result_page()
+        elif page == "candidate_form":
+            candidate_form_page()
+        elif page == "question_1":
+            question_1_page()
+        elif page == "question_2":
+            question_2_page()
+        elif page == "question_3":
+            question_3_page()
+        elif page == "question_4":
+            question_4_page()
+        elif page == "question_5":
+            question_5_page()
+        elif page == "question_6":
+            question_6_page()
+        elif page == "disc_result":
+            disc_result_page()
+        else:
+            user_selection_page()
 
 if __name__ == "__main__":
     main()
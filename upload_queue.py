@@ -0,0 +1,255 @@
+# upload_queue.py
+import fcntl
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+###############################################################################
+# Background Upload Queue (durable spool + retrying worker pool)
+###############################################################################
+# submit() writes the bytes to a local spool directory (fsynced) and returns
+# at once; worker threads upload spooled files and delete them on success.
+# Failed uploads are retried with exponential backoff and jitter. A job that
+# runs out of attempts stays in the spool, and so do jobs left behind by a
+# crashed or restarted process: a periodic rescan re-queues spooled jobs that
+# no live queue is working on, so nothing is lost while GCS is slow or down.
+#
+# Several processes may share one spool. A process works on a job only while
+# it holds an exclusive flock on the job's .lock file; the kernel drops the
+# lock when the process dies, so abandoned jobs become claimable again. A job
+# that has failed max_rounds rounds of attempts is parked in <spool>/failed/
+# and no longer retried.
+#
+# Spool layout, one set per job:
+#   <spool>/<job_id>.data   payload bytes
+#   <spool>/<job_id>.json   {"bucket", "blob", "content_type", "created_at", "failed_rounds"}
+#   <spool>/<job_id>.lock   claim held by the process working on the job
+###############################################################################
+UPLOAD_WORKERS = int(os.environ.get("DISC_UPLOAD_WORKERS", "4"))
+UPLOAD_SPOOL_DIR = os.environ.get("DISC_UPLOAD_SPOOL_DIR", "upload_spool")
+UPLOAD_MAX_ATTEMPTS = int(os.environ.get("DISC_UPLOAD_MAX_ATTEMPTS", "6"))
+UPLOAD_BACKOFF_S = float(os.environ.get("DISC_UPLOAD_BACKOFF_S", "1.0"))
+UPLOAD_MAX_BACKOFF_S = float(os.environ.get("DISC_UPLOAD_MAX_BACKOFF_S", "60"))
+# Seconds between spool rescans, and how old an unclaimed job must be to be adopted
+UPLOAD_RESCAN_S = float(os.environ.get("DISC_UPLOAD_RESCAN_S", "60"))
+# Rounds of max_attempts a job gets before it is parked in <spool>/failed/
+UPLOAD_MAX_ROUNDS = int(os.environ.get("DISC_UPLOAD_MAX_ROUNDS", "10"))
+# Finished job statuses remembered for status()
+UPLOAD_STATUS_HISTORY = 1000
+
+def _write_durable(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class UploadQueue:
+    """
+    upload_fn(bucket_name, blob_name, data: bytes, content_type: str) does one
+    upload attempt and raises on failure.
+    """
+    def __init__(self, upload_fn, spool_dir: str = UPLOAD_SPOOL_DIR, workers: int = UPLOAD_WORKERS,
+                 max_attempts: int = UPLOAD_MAX_ATTEMPTS, backoff_s: float = UPLOAD_BACKOFF_S,
+                 max_backoff_s: float = UPLOAD_MAX_BACKOFF_S, rescan_s: float = UPLOAD_RESCAN_S,
+                 max_rounds: int = UPLOAD_MAX_ROUNDS):
+        self.upload_fn = upload_fn
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.rescan_s = rescan_s
+        self.max_rounds = max_rounds
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._claims = {}              # job id -> fd of its held .lock file (queued, uploading or retrying here)
+        self._finished = OrderedDict() # job id -> "uploaded" | "failed" | "parked", oldest first
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"disc-upload-{i}", daemon=True) for i in range(workers)
+        ]
+        self._threads.append(threading.Thread(target=self._rescan_loop, name="disc-upload-rescan", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+        # Pick up whatever a previous process left behind
+        self.rescan()
+
+    def _paths(self, job_id: str):
+        base = os.path.join(self.spool_dir, job_id)
+        return f"{base}.data", f"{base}.json"
+
+    def _lock_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.lock")
+
+    def _claim(self, job_id: str) -> bool:
+        """Take the job's lock for this process; False if another live process holds it."""
+        fd = os.open(self._lock_path(job_id), os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        with self._lock:
+            self._claims[job_id] = fd
+        return True
+
+    def _release(self, job_id: str, done: bool):
+        """
+        Drop the claim. The lock file is only removed once the job's other files
+        are gone (done), so two processes can never lock different inodes for a
+        job that is still spooled.
+        """
+        with self._lock:
+            fd = self._claims.pop(job_id, None)
+        if done:
+            try:
+                os.remove(self._lock_path(job_id))
+            except OSError:
+                pass
+        if fd is not None:
+            os.close(fd)
+
+    def submit(self, bucket_name: str, blob_name: str, data: bytes, content_type: str = "text/csv") -> str:
+        """Spool `data` for upload to gs://bucket_name/blob_name; returns the job id."""
+        job_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex}"
+        data_path, meta_path = self._paths(job_id)
+        # Claimed before it is visible, so other processes' rescans skip it
+        self._claim(job_id)
+        _write_durable(data_path, data)
+        meta = {"bucket": bucket_name, "blob": blob_name, "content_type": content_type, "created_at": time.time(),
+                "failed_rounds": 0}
+        # The metadata file is written last: a job is only visible once complete
+        _write_durable(meta_path, json.dumps(meta).encode("utf-8"))
+        self._enqueue(job_id, attempt=1)
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        """
+        "pending", "uploaded", "failed" (still spooled, retried on rescan),
+        "parked" (moved to <spool>/failed/) or "unknown" (never seen here, or
+        finished long enough ago to be forgotten).
+        """
+        with self._lock:
+            if job_id in self._claims:
+                return "pending"
+            return self._finished.get(job_id, "unknown")
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._claims)
+
+    def _enqueue(self, job_id: str, attempt: int):
+        with self._lock:
+            self._finished.pop(job_id, None)
+        self._queue.put((job_id, attempt))
+
+    def _work(self):
+        while not self._stop.is_set():
+            job_id, attempt = self._queue.get()
+            data_path, meta_path = self._paths(job_id)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(data_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                # Already uploaded and removed by another process sharing the spool
+                self._finish(job_id, "uploaded")
+                continue
+
+            try:
+                self.upload_fn(meta["bucket"], meta["blob"], data, meta["content_type"])
+            except Exception as e:
+                if attempt >= self.max_attempts:
+                    self._fail_round(job_id, meta, attempt, e)
+                    continue
+                delay = min(self.max_backoff_s, self.backoff_s * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                print(f"Upload of {meta['blob']} failed (attempt {attempt}); retrying in {delay:.1f}s: {e}")
+                retry = threading.Timer(delay, self._queue.put, args=((job_id, attempt + 1),))
+                retry.daemon = True
+                retry.start()
+                continue
+
+            for path in (meta_path, data_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._finish(job_id, "uploaded")
+
+    def _fail_round(self, job_id: str, meta: dict, attempts: int, error: Exception):
+        """Record a round of failed attempts; park the job once it has used max_rounds."""
+        data_path, meta_path = self._paths(job_id)
+        meta["failed_rounds"] = meta.get("failed_rounds", 0) + 1
+        try:
+            if meta["failed_rounds"] < self.max_rounds:
+                # Rewriting the metadata also restarts the rescan age cutoff
+                _write_durable(meta_path, json.dumps(meta).encode("utf-8"))
+                print(f"Upload of {meta['blob']} failed after {attempts} attempts "
+                      f"(round {meta['failed_rounds']}/{self.max_rounds}); kept in spool: {error}")
+                self._finish(job_id, "failed")
+                return
+            os.makedirs(self.failed_dir, exist_ok=True)
+            os.replace(data_path, os.path.join(self.failed_dir, os.path.basename(data_path)))
+            _write_durable(os.path.join(self.failed_dir, os.path.basename(meta_path)), json.dumps(meta).encode("utf-8"))
+            os.remove(meta_path)
+        except OSError as e:
+            print(f"Could not update spooled upload {job_id}: {e}")
+            self._finish(job_id, "failed")
+            return
+        print(f"Upload of {meta['blob']} failed {meta['failed_rounds']} rounds; parked in {self.failed_dir}: {error}")
+        self._finish(job_id, "parked")
+
+    def _finish(self, job_id: str, status: str):
+        self._release(job_id, done=status != "failed")
+        with self._lock:
+            self._finished[job_id] = status
+            self._finished.move_to_end(job_id)
+            while len(self._finished) > UPLOAD_STATUS_HISTORY:
+                self._finished.popitem(last=False)
+
+    def rescan(self, min_age_s: float = None) -> int:
+        """Claim and queue spooled jobs no live process holds that are older than min_age_s. Returns how many."""
+        min_age_s = self.rescan_s if min_age_s is None else min_age_s
+        now = time.time()
+        adopted = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            with self._lock:
+                if job_id in self._claims:
+                    continue
+            try:
+                if now - os.path.getmtime(os.path.join(self.spool_dir, name)) < min_age_s:
+                    continue
+            except OSError:
+                continue
+            if not self._claim(job_id):
+                continue
+            self._enqueue(job_id, attempt=1)
+            adopted += 1
+        return adopted
+
+    def _rescan_loop(self):
+        while not self._stop.wait(self.rescan_s):
+            try:
+                adopted = self.rescan()
+                if adopted:
+                    print(f"Re-queued {adopted} spooled upload(s).")
+            except Exception as e:
+                print(f"Upload spool rescan failed: {e}")
+
+    def stop(self):
+        """Stop the rescan loop and workers after their current job; spooled jobs stay on disk."""
+        self._stop.set()
@@ -0,0 +1,263 @@
+# vector_index.py
+import json
+import math
+import sys
+import time
+import numpy as np
+
+###############################################################################
+# Hybrid vector methods
+###############################################################################
+# How chunk vectors were built, recorded on the pickled vectorizer so the
+# query side matches however the artifacts are deployed:
+#   "matmul"     TF-IDF row @ vocabulary embedding matrix (build_index.py)
+#   "per-token"  TF-IDF-weighted sum of per-token embeddings (legacy pickles,
+#                which carry no attribute)
+HYBRID_METHOD_ATTR = "disc_hybrid_method_"
+HYBRID_METHODS = ("per-token", "matmul")
+
+def hybrid_method_of(vectorizer) -> str:
+    return getattr(vectorizer, HYBRID_METHOD_ATTR, "per-token")
+
+###############################################################################
+# Exact search helpers
+###############################################################################
+def normalise_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+def top_n_indices(sims: np.ndarray, n: int) -> np.ndarray:
+    """
+    Positions of the n highest similarities, best first, in O(k) via argpartition.
+    Ties are broken by lower position, matching a stable descending sort.
+    """
+    k = len(sims)
+    n = min(n, k)
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    if n < k:
+        candidates = np.argpartition(-sims, n - 1)[:n]
+        # Pull in every chunk tied with the n-th score so the cut is deterministic
+        candidates = np.flatnonzero(sims >= sims[candidates].min())
+    else:
+        candidates = np.arange(k)
+    order = np.lexsort((candidates, -sims[candidates]))
+    return candidates[order][:n]
+
+def dot_rows(vectors: np.ndarray, query: np.ndarray, scales: np.ndarray = None) -> np.ndarray:
+    """
+    vectors @ query for float32, float16 or int8 rows. Compact rows are
+    dequantised to float32 one block at a time, so the full-precision matrix
+    is never materialised; int8 rows are multiplied by their per-row scale.
+    """
+    if vectors.dtype == np.float32 and scales is None:
+        return vectors @ query
+    out = np.empty((len(vectors),) + query.shape[1:], dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        stop = start + SCORE_BLOCK_ROWS
+        block = np.asarray(vectors[start:stop], dtype=np.float32) @ query
+        if scales is not None:
+            block *= scales[start:stop] if block.ndim == 1 else scales[start:stop, None]
+        out[start:stop] = block
+    return out
+
+def exact_search(vectors: np.ndarray, query: np.ndarray, n: int, scales: np.ndarray = None):
+    """Brute-force (positions, sims) of the n best rows for a normalised query."""
+    sims = dot_rows(vectors, query, scales)
+    top = top_n_indices(sims, n)
+    return top, sims[top]
+
+###############################################################################
+# Compact vector storage (float16 / per-row int8)
+###############################################################################
+VECTOR_DTYPES = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 8192
+
+def quantise_rows(vectors: np.ndarray, vector_dtype: str):
+    """Returns (stored_vectors, scales); scales is None except for int8."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vector_dtype == "float32":
+        return vectors, None
+    if vector_dtype == "float16":
+        return vectors.astype(np.float16), None
+    if vector_dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+        safe = np.where(scales > 0, scales, 1.0)[:, None]
+        quantised = np.clip(np.rint(vectors / safe), -127, 127).astype(np.int8)
+        return quantised, scales.astype(np.float32)
+    raise ValueError(f"Unknown vector dtype {vector_dtype!r}; expected one of {VECTOR_DTYPES}")
+
+def dequantise_rows(vectors: np.ndarray, scales: np.ndarray = None) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors * scales[:, None] if scales is not None else vectors
+
+###############################################################################
+# IVF (inverted file) approximate index
+###############################################################################
+# Rows are clustered with spherical k-means into `nlist` cells. A query is
+# compared with the cell centroids, the `nprobe` closest cells are opened and
+# only their rows are scored exactly. nprobe is the recall/latency knob:
+# nprobe == nlist is exact search, smaller values touch fewer rows.
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0):
+    """Returns (centroids, assignments) for L2-normalised rows."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(len(vectors), nlist, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Empty cells keep their previous centroid
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = normalise_rows(sums)
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+    return centroids, assignments
+
+class IVFIndex:
+    """Read-only IVF index over the rows of one (k, dim) normalised matrix."""
+    def __init__(self, centroids: np.ndarray, list_positions: np.ndarray, list_offsets: np.ndarray, nprobe: int):
+        self.centroids = centroids
+        self.list_positions = list_positions
+        self.list_offsets = list_offsets
+        self.nprobe = nprobe
+        for array in (self.centroids, self.list_positions, self.list_offsets):
+            array.setflags(write=False)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int = None, nprobe: int = None, iterations: int = 10, seed: int = 0):
+        k = len(vectors)
+        nlist = nlist or max(1, int(round(math.sqrt(k))))
+        nlist = min(nlist, k)
+        nprobe = nprobe or max(1, nlist // 10)
+        centroids, assignments = spherical_kmeans(vectors, nlist, iterations, seed)
+        list_positions = np.argsort(assignments, kind="stable")
+        list_offsets = np.searchsorted(assignments[list_positions], np.arange(nlist + 1))
+        return cls(centroids, list_positions.astype(np.int64), list_offsets.astype(np.int64), min(nprobe, nlist))
+
+    def candidates(self, query: np.ndarray, nprobe: int = None) -> np.ndarray:
+        """Sorted row positions in the nprobe cells closest to the query."""
+        probe = top_n_indices(self.centroids @ query, nprobe or self.nprobe)
+        cells = [self.list_positions[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe]
+        return np.sort(np.concatenate(cells))
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, n: int, nprobe: int = None, scales: np.ndarray = None):
+        """Approximate (positions, sims) of the n best rows for a normalised query."""
+        candidates = self.candidates(query, nprobe)
+        if len(candidates) < n:
+            return exact_search(vectors, query, n, scales)
+        sims = dot_rows(vectors[candidates], query, None if scales is None else scales[candidates])
+        top = top_n_indices(sims, n)
+        return candidates[top], sims[top]
+
+###############################################################################
+# Recall / precision measurement against brute-force float32
+###############################################################################
+def sample_queries(vectors: np.ndarray, sample_size: int, noise: float, rng) -> np.ndarray:
+    """
+    Sampled rows with Gaussian noise added (noise=0.5 gives a cosine of ~0.9
+    to the source row), so they behave like new answers, not indexed copies.
+    """
+    k, dim = vectors.shape
+    picks = rng.choice(k, min(sample_size, k), replace=False)
+    return normalise_rows(vectors[picks] + rng.normal(scale=noise / math.sqrt(dim), size=(len(picks), dim)))
+
+def measure_recall(store, n: int = 4, nprobe: int = None, sample_size: int = 200, noise: float = 0.5, seed: int = 0) -> dict:
+    """recall@n and per-query latency of IVF vs exact search for every question of a store."""
+    rng = np.random.default_rng(seed)
+    report = {}
+    for question_id, (start, stop) in store.question_ranges.items():
+        vectors = dequantise_rows(store.vectors[start:stop], _scales(store, start, stop))
+        k = len(vectors)
+        queries = sample_queries(vectors, sample_size, noise, rng)
+
+        build_start = time.perf_counter()
+        ivf = IVFIndex.build(vectors, nprobe=nprobe, seed=seed)
+        build_s = time.perf_counter() - build_start
+
+        hits = 0
+        exact_s = ann_s = 0.0
+        candidates_seen = 0
+        for query in queries:
+            t0 = time.perf_counter()
+            exact_pos, _ = exact_search(vectors, query, n)
+            t1 = time.perf_counter()
+            ann_pos, _ = ivf.search(vectors, query, n)
+            t2 = time.perf_counter()
+            exact_s += t1 - t0
+            ann_s += t2 - t1
+            hits += len(np.intersect1d(exact_pos, ann_pos))
+            candidates_seen += len(ivf.candidates(query))
+
+        report[question_id] = {
+            "chunks": k,
+            "nlist": ivf.nlist,
+            "nprobe": ivf.nprobe,
+            f"recall@{n}": hits / (len(queries) * min(n, k)),
+            "exact_ms_per_query": 1000 * exact_s / len(queries),
+            "ann_ms_per_query": 1000 * ann_s / len(queries),
+            "mean_fraction_scored": candidates_seen / (len(queries) * k),
+            "build_s": build_s,
+        }
+    return report
+
+def compare_precision(store, vector_dtype: str, n: int = 4, sample_size: int = 200, noise: float = 0.5, seed: int = 0) -> dict:
+    """
+    Quantise each question's float32 vectors to `vector_dtype` and compare
+    with full precision: top-n set agreement, top-1 agreement, drift of the
+    max similarity (what get_max_similarity returns) and vector memory.
+    """
+    rng = np.random.default_rng(seed)
+    report = {}
+    for question_id, (start, stop) in store.question_ranges.items():
+        full = dequantise_rows(store.vectors[start:stop], _scales(store, start, stop))
+        compact, scales = quantise_rows(full, vector_dtype)
+        queries = sample_queries(full, sample_size, noise, rng)
+
+        same_set = same_top1 = 0
+        drifts = []
+        for query in queries:
+            full_pos, full_sims = exact_search(full, query, n)
+            compact_pos, compact_sims = exact_search(compact, query, n, scales)
+            same_set += set(full_pos.tolist()) == set(compact_pos.tolist())
+            same_top1 += int(full_pos[0] == compact_pos[0])
+            drifts.append(abs(float(full_sims[0]) - float(compact_sims[0])))
+
+        compact_bytes = compact.nbytes + (scales.nbytes if scales is not None else 0)
+        report[question_id] = {
+            "chunks": len(full),
+            "vector_dtype": vector_dtype,
+            f"top{n}_set_agreement": same_set / len(queries),
+            "top1_agreement": same_top1 / len(queries),
+            "max_similarity_drift_mean": float(np.mean(drifts)),
+            "max_similarity_drift_max": float(np.max(drifts)),
+            "float32_bytes": full.nbytes,
+            "compact_bytes": compact_bytes,
+        }
+    return report
+
+def _scales(store, start: int, stop: int):
+    return None if store.vector_scales is None else np.asarray(store.vector_scales[start:stop])
+
+
+if __name__ == "__main__":
+    # python vector_index.py recall <chunk_store_dir> [nprobe]
+    # python vector_index.py precision <chunk_store_dir> float16|int8
+    from chunk_store import ColumnarChunks
+
+    if len(sys.argv) not in (3, 4) or sys.argv[1] not in ("recall", "precision"):
+        print("usage: python vector_index.py recall <chunk_store_dir> [nprobe]")
+        print("       python vector_index.py precision <chunk_store_dir> float16|int8")
+        sys.exit(1)
+    store = ColumnarChunks(sys.argv[2])
+    if sys.argv[1] == "recall":
+        nprobe_arg = int(sys.argv[3]) if len(sys.argv) == 4 else None
+        print(json.dumps(measure_recall(store, n=4, nprobe=nprobe_arg), indent=2))
+    else:
+        dtype_arg = sys.argv[3] if len(sys.argv) == 4 else "int8"
+        print(json.dumps(compare_precision(store, dtype_arg, n=4), indent=2))